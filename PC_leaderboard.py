@@ -1,24 +1,86 @@
 import serial
 import serial.tools.list_ports
+import argparse
 import json
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import sqlite3
+import codecs
+from http.server import BaseHTTPRequestHandler
+import http.client
+import asyncio
+import concurrent.futures
+import io
 import threading
+import functools
+import hashlib
+import types
+import bisect
+import heapq
+import itertools
 import time
+import random
+import unicodedata
 import os
+import sys
+import tracemalloc
 import urllib.parse
+import zipfile
+import zlib
+from xml.sax.saxutils import escape as xml_escape
 import socket
-import tkinter as tk
-from tkinter import ttk, messagebox
-import webbrowser
+try: import numpy as np # Optional: vectorized bulk rescoring (a plain Python loop is used without it)
+except ImportError: np = None
+# tkinter and webbrowser are imported where a window is shown, so --headless never loads them
+process_started_at = time.perf_counter() # Startup timings (listening, first request served) are measured from here
 
 # Configuration
 SERIAL_PORT = None
+HEADLESS = False # No Tk windows (port picker, popups, error boxes); set by --headless
+SERIAL_USB_IDS = ((0x303A, None), (0x10C4, 0xEA60), (0x1A86, 0x55D4), (0x1A86, 0x7523), (0x0403, 0x6001)) # Bridge (VID, PID), first match wins; None = any PID. Espressif USB, CP210x, CH9102, CH340, FT232R
+SERIAL_USB_SERIAL_NUMBER = None # When set, only the USB adapter with this serial number is taken as the bridge
+SERIAL_HOTPLUG_POLL_INTERVAL = 0.05 # Seconds between checks for an unplugged bridge coming back
+SERIAL_RECONNECT_BASE_DELAY = 0.1 # First retry delay after a failed open; doubles per failure up to the max, with full jitter
+SERIAL_RECONNECT_MAX_DELAY = 5.0
 BAUD_RATE = 115200
+SERIAL_READ_TIMEOUT = 1 # Blocking read timeout (s) in serial_listener; data is returned as soon as it arrives
+SERIAL_MAX_LINE_BYTES = 64 * 1024 # A "line" longer than this without a newline is garbage and gets dropped
 WEB_SERVER_HOST = "0.0.0.0"
 WEB_SERVER_PORT = 8080
+SSE_KEEPALIVE_SECONDS = 15 # Comment line sent on idle event streams so proxies/APs don't drop them
+HTTP_WORKER_THREADS = 16 # Pool that runs the (blocking) route handlers; the event loop only does socket I/O
+HTTP_READ_TIMEOUT = 15 # Seconds a client gets to send its request headers and body
+HTTP_MAX_BODY_BYTES = 1024 * 1024
+INGEST_QUEUE_MAX = 1000 # Bounded queue between producers (serial, POST /add, admin) and the committer
+INGEST_BATCH_MAX = 256 # Most submissions merged and persisted by one commit
+INGEST_BATCH_LINGER = 0.002 # Seconds the committer waits for more submissions before committing a lone one
+INGEST_RATE_PER_SOURCE = 2.0 # Results per second one source (device, client IP) may sustain...
+INGEST_BURST_PER_SOURCE = 10 # ...after a burst of this many; beyond that POST /add gets 503 Retry-After
+INGEST_ADMISSION_MAX_SOURCES = 4096 # Token buckets kept; the least recently seen source is forgotten first
+INGEST_QUEUE_RETRY_AFTER = 1 # Retry-After (s) sent when the ingest queue itself is full
+RESCORE_CHUNK_ROWS = 4096 # Rows scored per step of the background rescore (progress granularity)
+RESCORE_APPLY_ATTEMPTS = 3 # Rescores of a fresh snapshot when the board changed too much to merge the last one
+EXPORT_CHUNK_BYTES = 64 * 1024 # Exports are generated and sent in pieces of about this size
+EXPORT_CACHE_MAX_BYTES = 8 * 1024 * 1024 # Finished exports up to this size are kept for repeat downloads
+COMPRESSION_MIN_BYTES = 1024 # Smaller bodies are sent as they are; gzip overhead would eat the saving
+COMPRESSION_LEVEL = 6
+COMPRESSION_CACHE_MAX_ENTRIES = 64 # Compressed bodies kept per (content version, encoding); oldest dropped first
 ADMIN_PASSWORD = "SPSIT" # CHANGE THIS
-leaderboard_file = "leaderboard.json"
+leaderboard_file = "leaderboard.json" # Snapshot of the board
+leaderboard_journal_file = "leaderboard.journal" # Append-only log of changes since the snapshot
+JOURNAL_SNAPSHOT_EVERY = 500 # Journal records before a snapshot + compaction
+STORAGE_BACKEND = "journal" # "journal" (JSON snapshot + journal + correct_answers.json) or "sqlite" (leaderboard_db_file)
+leaderboard_db_file = "leaderboard.sqlite3" # SQLite backend; imports the JSON files on first use
+LEADERBOARD_CHUNK_SIZE = 256 # Entries per shared chunk of a board snapshot; a write copies one chunk, not the board
+LEADERBOARD_CHANGELOG_MAX = 1000 # Recent changes kept per snapshot for delta sync; older clients get a full board
+SEARCH_RESULTS_MAX = 100 # Most participants returned by one /api/search request
+TABLE_RENDER_CACHE_MAX_ENTRIES = 64 # Rendered windows (category, page, me=) kept; least recently used dropped first
+SUBMISSION_DEDUPE_TTL = 24 * 3600 # Seconds a device submission ID is remembered; a retry inside it is acked, not re-applied
+SUBMISSION_DEDUPE_MAX = 20000 # Most remembered submission IDs; oldest dropped first
 correct_answers_file = "correct_answers.json"
+PROFILE_SAMPLE_INTERVAL = 0.005 # Seconds between stack samples while /admin_profile runs
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 120
+TRACEMALLOC_FRAMES = 10 # Stack depth kept per allocation while tracemalloc traces
+TRACEMALLOC_TOP = 40 # Lines reported per tracemalloc diff
 
 # Category Configuration
 CATEGORY1_UID_STR = "0xF30xC70x1A0x130x3D"
@@ -32,18 +94,123 @@ CATEGORY_UIDS = {
 CATEGORY_NAMES_CONFIG_KEYS = ["Category1", "Category2", "Category3"]
 
 # --- Global Variables ---
-leaderboard_data = []
-correct_answers_config = {}
-
-GENERAL_MAX_QUESTIONS = 15
-NUM_QUESTIONS_PER_CATEGORY = {key: 15 for key in CATEGORY_NAMES_CONFIG_KEYS}
-PENALTY_PER_INCORRECT = 60
-CATEGORY_DISPLAY_NAMES = {key: f"Kategória {i+1}" for i, key in enumerate(CATEGORY_NAMES_CONFIG_KEYS)}
-CATEGORY_DISPLAY_NAMES["All Categories"] = "Všetky kategórie"
-CATEGORY_SECTIONS = {key: [] for key in CATEGORY_NAMES_CONFIG_KEYS}
+# leaderboard_store is created next to LeaderboardStore; the applied config is the immutable
+# ConfigSnapshot in active_config, created next to the config functions
+
+# --- Metrics (Prometheus text format on /metrics) ---
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Seconds
+metrics_registry = []
+
+def metric_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class MetricHistogram:
+    # Fixed-bucket histogram with optional labels. observe() is one bisect and two adds under a lock; the
+    # per-bucket counts are made cumulative only when /metrics is rendered.
+    def __init__(self, name, help_text, label_names=(), buckets=METRIC_BUCKETS):
+        self.name = name; self.help_text = help_text; self.label_names = label_names; self.buckets = buckets
+        self._series = {} # label values -> [count per bucket..., count above the last bucket, sum]
+        self._lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def observe(self, seconds, *label_values):
+        bucket_idx = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None: series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bucket_idx] += 1; series[-1] += seconds
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help_text}"); lines.append(f"# TYPE {self.name} histogram")
+        with self._lock: all_series = [(label_values, list(series)) for label_values, series in self._series.items()]
+        for label_values, series in all_series:
+            labels = ",".join(f'{name}="{metric_label_value(value)}"' for name, value in zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels + "," if labels else ""}le="{bound}"}} {cumulative}')
+            label_block = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{label_block} {series[-1]:.6f}"); lines.append(f"{self.name}_count{label_block} {cumulative}")
+
+def timed(histogram, *label_values):
+    # Decorator: observe the wrapped call's duration (also when it raises)
+    def wrap(fn):
+        @functools.wraps(fn)
+        def timed_fn(*args, **kwargs):
+            started = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally: histogram.observe(time.perf_counter() - started, *label_values)
+        return timed_fn
+    return wrap
+
+http_request_seconds = MetricHistogram("leaderboard_http_request_seconds", "Time to handle an HTTP request, by method, route and status.",
+                                       ("method", "route", "status"))
+add_result_seconds = MetricHistogram("leaderboard_add_seconds", "add_to_leaderboard() calls until the result is committed (or queued).")
+apply_submission_seconds = MetricHistogram("leaderboard_apply_submission_seconds", "Scoring and merging one result on the state owner.")
+ingest_lag_seconds = MetricHistogram("leaderboard_ingest_lag_seconds", "From receiving a result (serial line, POST) to its committed write.")
+storage_write_seconds = MetricHistogram("leaderboard_storage_write_seconds", "Storage writes: appended records or a full rewrite.", ("op",))
+save_leaderboard_seconds = MetricHistogram("leaderboard_save_seconds", "save_leaderboard(): full rewrite and store reset.")
+table_render_seconds = MetricHistogram("leaderboard_table_render_seconds", "Rendering the leaderboard table HTML.")
+serial_line_seconds = MetricHistogram("leaderboard_serial_line_seconds", "Parsing and queueing one serial line.")
 
 # --- GUI and Serial Port Selection ---
+serial_bridge_match = None # (usb_ids, serial_number) that finds the bridge again if it comes back under another port name
+
+def parse_usb_id(usb_id_text):
+    # "303a:1001" or "303a:*" (any PID) -> (vid, pid or None); for --usb-id
+    try:
+        vid_text, pid_text = usb_id_text.split(":")
+        return int(vid_text, 16), None if pid_text == "*" else int(pid_text, 16)
+    except ValueError: raise argparse.ArgumentTypeError(f"'{usb_id_text}' is not VID:PID in hex (PID may be *).")
+
+def find_bridge_port_info(ports, usb_ids=SERIAL_USB_IDS, serial_number=None):
+    # The bridge among ports: the adapter with serial_number when given, else the first usb_ids match (in priority order)
+    if serial_number: return next((port_info for port_info in ports if port_info.serial_number == serial_number), None)
+    for vid, pid in usb_ids:
+        for port_info in ports:
+            if port_info.vid == vid and (pid is None or port_info.pid == pid): return port_info
+    return None
+
+def resolve_serial_port():
+    # Port to open now, or None while the bridge is unplugged. The chosen name is checked first (a stat on POSIX, no
+    # port scan); a replugged adapter may come back under another name, so then it is looked up by serial_bridge_match.
+    global SERIAL_PORT
+    if SERIAL_PORT is not None and os.name == "posix":
+        if os.path.exists(SERIAL_PORT): return SERIAL_PORT
+        if serial_bridge_match is None: return None
+    ports = list(serial.tools.list_ports.comports())
+    if SERIAL_PORT is not None and any(port_info.device == SERIAL_PORT for port_info in ports): return SERIAL_PORT
+    if serial_bridge_match is None: return None
+    bridge_info = find_bridge_port_info(ports, *serial_bridge_match)
+    if bridge_info is None: return None
+    if bridge_info.device != SERIAL_PORT: print(f"Serial bridge found on {bridge_info.device} ({bridge_info.description}).")
+    SERIAL_PORT = bridge_info.device
+    return SERIAL_PORT
+
+class SerialReconnectBackoff:
+    # Exponential backoff with full jitter: retry n waits uniform(0, min(max_delay, base_delay * 2**n)) seconds, so a
+    # quickly cleared fault costs milliseconds and a persistent one doesn't spin
+    def __init__(self, base_delay=SERIAL_RECONNECT_BASE_DELAY, max_delay=SERIAL_RECONNECT_MAX_DELAY):
+        self.base_delay = base_delay; self.max_delay = max_delay; self.failures = 0
+
+    def next_delay(self):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** min(self.failures, 16)))
+        self.failures += 1
+        return delay
+
+    def reset(self): self.failures = 0
+
+def show_error_dialog(title, message):
+    # Tk error box in the windowed mode; headless runs only have the console
+    if HEADLESS: return
+    try:
+        from tkinter import messagebox
+        messagebox.showerror(title, message)
+    except Exception as e_dialog: print(f"Could not show '{title}' dialog: {e_dialog}")
+
 def find_serial_port(root_window):
+    import tkinter as tk
+    from tkinter import ttk, messagebox
     ports = list(serial.tools.list_ports.comports())
     if not ports:
         messagebox.showerror("Error", "No serial ports found. ESP32 connected?", parent=root_window)
@@ -67,157 +234,1330 @@ def find_serial_port(root_window):
     root_window.mainloop() # This blocks until window is closed
     return selected_port_result
 
+def choose_serial_port_gui():
+    import tkinter as tk
+    root_serial_gui = tk.Tk(); root_serial_gui.title("Select Serial Port")
+    try: num_avail_ports = len(list(serial.tools.list_ports.comports()))
+    except: num_avail_ports = 0
+    win_width_sel, win_height_sel = 400, 100 + max(1, num_avail_ports) * 30
+    root_serial_gui.geometry(f"{win_width_sel}x{win_height_sel}")
+    root_serial_gui.eval('tk::PlaceWindow . center'); root_serial_gui.attributes('-topmost', True)
+    return find_serial_port(root_serial_gui) # This function handles its own mainloop
+
 # --- Leaderboard Persistence & Management ---
+class LeaderboardJournal:
+    # Snapshot file (plain JSON list) + journal of compact one-line records appended after it.
+    # Records: {"op": "put", "entry": {...}} inserts/replaces by (name, category); {"op": "clear"} empties the board;
+    # {"op": "seen", "id": "<device>:<seq>:<digest>", "at": ts} marks a device submission as committed (see load()'s submission_ids);
+    # "carried": true on a "seen" record re-appended right after a snapshot (JournalStorage.replace_entries).
+    def __init__(self, snapshot_path, journal_path, snapshot_every=JOURNAL_SNAPSHOT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.snapshot_every = max(1, snapshot_every)
+        self.records_since_snapshot = 0 # Every record except carried "seen" ones, counted alike on append and on load()
+        self.submission_ids = {} # id -> committed at, from the "seen" records of the last load()
+        self._journal_fh = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        entries = []
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                loaded_data = json.load(f)
+            if isinstance(loaded_data, list): entries = loaded_data
+        self.records_since_snapshot = 0; self.submission_ids = {}
+        if not os.path.exists(self.journal_path): return entries
+        by_key = {(e.get("name", "").strip(), e.get("category")): i for i, e in enumerate(entries)}
+        good_end = 0 # Byte offset just past the last complete, newline-terminated record
+        with open(self.journal_path, "rb") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip(): good_end += len(line); continue
+                try:
+                    if not line.endswith(b"\n"): raise ValueError("unterminated record")
+                    record = json.loads(line)
+                except ValueError: # Torn tail after a crash mid-append (JSON/UTF-8 errors included); nothing valid can follow it
+                    print(f"Warning: Ignoring unreadable journal record at line {line_no}."); break
+                good_end += len(line)
+                if not record.get("carried"): self.records_since_snapshot += 1
+                if record.get("op") == "clear":
+                    entries = []; by_key = {}
+                elif record.get("op") == "put" and isinstance(record.get("entry"), dict):
+                    entry = record["entry"]; key = (entry.get("name", "").strip(), entry.get("category"))
+                    if key in by_key: entries[by_key[key]] = entry
+                    else: by_key[key] = len(entries); entries.append(entry)
+                elif record.get("op") == "seen" and isinstance(record.get("id"), str):
+                    self.submission_ids[record["id"]] = record.get("at", 0)
+        if good_end < os.path.getsize(self.journal_path):
+            # Cut the torn tail off now: the next append would otherwise be glued onto it and lost with it on the next load
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good_end); f.flush(); os.fsync(f.fileno())
+            print(f"Journal truncated to its last complete record ({good_end} bytes).")
+        return entries
+
+    def append(self, record):
+        return self.append_many([record])
+
+    def append_many(self, records):
+        # One write + one fsync for the whole batch (group commit). Carried records don't make the journal any
+        # more due for the next snapshot.
+        lines = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records)
+        with self._lock:
+            if self._journal_fh is None: self._journal_fh = open(self.journal_path, "a", encoding="utf-8")
+            self._journal_fh.write(lines); self._journal_fh.flush()
+            os.fsync(self._journal_fh.fileno())
+            self.records_since_snapshot += sum(1 for record in records if not record.get("carried"))
+            return self.records_since_snapshot >= self.snapshot_every # Caller should snapshot soon
+
+    def snapshot(self, entries):
+        # Write the full board to a temp file, swap it in atomically, then truncate the journal it supersedes
+        tmp_path = self.snapshot_path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, separators=(",", ":"))
+                f.flush(); os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            if self._journal_fh is not None: self._journal_fh.close()
+            self._journal_fh = open(self.journal_path, "w", encoding="utf-8")
+            self.records_since_snapshot = 0
+
+class JournalStorage:
+    # Storage interface used by the persistence functions below (SQLiteStorage implements the same methods):
+    #   load_entries() -> (entries, compact_now)    write_records(records) -> compact_soon    replace_entries(entries)
+    #   load_config() -> dict, or None if nothing is stored yet                             save_config(config)
+    #   load_submission_ids() -> {submission id: committed at} for the last SUBMISSION_DEDUPE_TTL seconds
+    # Records are the journal's {"op": "put", "entry": ...} / {"op": "clear"} / {"op": "seen", ...} dicts, already
+    # applied to the store. The snapshot only holds the board, so live "seen" records are re-appended after it.
+    name = "journal"
+
+    def __init__(self, journal, config_path):
+        self.journal = journal
+        self.config_path = config_path
+        self._submission_ids = {}
+
+    def load_entries(self):
+        entries = self.journal.load()
+        self._submission_ids = dict(self.journal.submission_ids)
+        # Compact so the next start is a plain snapshot load (a journal of carried records alone doesn't call for it)
+        return entries, self.journal.records_since_snapshot > 0
+
+    def write_records(self, records):
+        for record in records:
+            if record.get("op") == "seen": self._submission_ids[record["id"]] = record["at"]
+        return self.journal.append_many(records)
+
+    def replace_entries(self, entries):
+        self.journal.snapshot(entries)
+        cutoff = time.time() - SUBMISSION_DEDUPE_TTL
+        self._submission_ids = {s_id: at for s_id, at in self._submission_ids.items() if at >= cutoff}
+        if self._submission_ids:
+            self.journal.append_many([{"op": "seen", "id": s_id, "at": at, "carried": True} for s_id, at in self._submission_ids.items()])
+
+    def load_submission_ids(self):
+        cutoff = time.time() - SUBMISSION_DEDUPE_TTL
+        return {s_id: at for s_id, at in self._submission_ids.items() if at >= cutoff}
+
+    def load_config(self):
+        if not os.path.exists(self.config_path): return None
+        with open(self.config_path, "r", encoding="utf-8") as f: return json.load(f)
+
+    def save_config(self, config):
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=4)
+
+class SQLiteStorage:
+    # One SQLite database in WAL mode. Results are plain columns (no JSON to parse at startup) with a unique index on
+    # (name, category) and a covering index on (category, disqualified, time, penalty, seq) for ranked reads; a put
+    # is an upsert that only replaces the stored row with a better result. The config is one JSON row; committed
+    # device submission IDs live in their own table and are written in the same transaction as their result.
+    # Opened lazily; on first open an empty database imports the JSON files of the journal backend.
+    name = "sqlite"
+    ENTRY_COLUMNS = ("name", "category", "disqualified", "time", "penalty", "original_time", "answers")
+
+    def __init__(self, db_path, legacy_storage=None):
+        self.db_path = db_path
+        self.legacy_storage = legacy_storage
+        self._conn = None
+        self._seq = 0 # Arrival order for ties, like LeaderboardStore's seq
+        self._lock = threading.Lock() # One connection shared by the state owner and the persist executor
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL") # Every commit is durable, like the journal's fsync
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS results (
+                    name TEXT NOT NULL, category TEXT NOT NULL, disqualified INTEGER NOT NULL, time REAL NOT NULL,
+                    penalty REAL NOT NULL, original_time REAL NOT NULL, answers TEXT, seq INTEGER NOT NULL, extra TEXT);
+                CREATE UNIQUE INDEX IF NOT EXISTS results_participant ON results (name, category);
+                CREATE INDEX IF NOT EXISTS results_ranked ON results (category, disqualified, time, penalty, seq);
+                CREATE TABLE IF NOT EXISTS config (id INTEGER PRIMARY KEY CHECK (id = 1), body TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS submissions (id TEXT PRIMARY KEY, seen_at REAL NOT NULL);
+            """)
+            self._conn = conn
+            self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM results").fetchone()[0]
+            if self.legacy_storage is not None: self._import_legacy()
+        return self._conn
+
+    def _import_legacy(self):
+        conn = self._conn
+        if conn.execute("SELECT 1 FROM config").fetchone() or conn.execute("SELECT 1 FROM results LIMIT 1").fetchone(): return
+        legacy_config = self.legacy_storage.load_config()
+        legacy_entries, _ = self.legacy_storage.load_entries()
+        if legacy_config is None and not legacy_entries: return
+        print(f"Importing {len(legacy_entries)} results{' and the config' if legacy_config is not None else ''} into {self.db_path}.")
+        if legacy_entries: self._replace_entries(legacy_entries)
+        if legacy_config is not None: self._save_config(legacy_config)
+
+    def _row(self, entry):
+        extra = {k: v for k, v in entry.items() if k not in self.ENTRY_COLUMNS}
+        self._seq += 1
+        return (entry.get("name", "").strip(), entry.get("category"), int(bool(entry.get("disqualified", False))),
+                entry.get("time", 0), entry.get("penalty", 0),
+                entry.get("original_time", entry.get("time", 0) - entry.get("penalty", 0)), entry.get("answers"),
+                self._seq, json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    def load_entries(self):
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT name, category, disqualified, time, penalty, original_time, answers, extra FROM results "
+                "ORDER BY category, disqualified, time, penalty, seq").fetchall()
+        entries = []
+        for name, category, disqualified, time_val, penalty, original_time, answers, extra in rows:
+            entry = {"name": name, "time": time_val, "original_time": original_time, "penalty": penalty,
+                     "category": category, "disqualified": bool(disqualified)}
+            if answers is not None: entry["answers"] = answers
+            if extra: entry.update(json.loads(extra)) # Only legacy entries with unknown keys have one
+            entries.append(entry)
+        return entries, False
+
+    def write_records(self, records):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for record in records:
+                    if record.get("op") == "clear": conn.execute("DELETE FROM results")
+                    elif record.get("op") == "put":
+                        conn.execute(
+                            "INSERT INTO results (name, category, disqualified, time, penalty, original_time, answers, seq, extra) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (name, category) DO UPDATE SET "
+                            "disqualified = excluded.disqualified, time = excluded.time, penalty = excluded.penalty, "
+                            "original_time = excluded.original_time, answers = excluded.answers, extra = excluded.extra "
+                            "WHERE (excluded.disqualified, excluded.time, excluded.penalty) < (results.disqualified, results.time, results.penalty)",
+                            self._row(record["entry"]))
+                    elif record.get("op") == "seen":
+                        conn.execute("INSERT INTO submissions (id, seen_at) VALUES (?, ?) ON CONFLICT (id) DO NOTHING",
+                                     (record["id"], record["at"]))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK"); raise
+        return False # Nothing to compact
+
+    def replace_entries(self, entries):
+        with self._lock:
+            self._connection(); self._replace_entries(entries)
+
+    def _replace_entries(self, entries):
+        # Full rewrite in one transaction (rescore, reset); rows keep the order they are given in
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM results"); self._seq = 0
+            conn.executemany(
+                "INSERT INTO results (name, category, disqualified, time, penalty, original_time, answers, seq, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (name, category) DO NOTHING", (self._row(e) for e in entries))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK"); raise
+
+    def load_submission_ids(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM submissions WHERE seen_at < ?", (time.time() - SUBMISSION_DEDUPE_TTL,))
+            return dict(conn.execute("SELECT id, seen_at FROM submissions").fetchall())
+
+    def load_config(self):
+        with self._lock:
+            row = self._connection().execute("SELECT body FROM config WHERE id = 1").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_config(self, config):
+        with self._lock:
+            self._connection(); self._save_config(config)
+
+    def _save_config(self, config):
+        self._conn.execute("INSERT INTO config (id, body) VALUES (1, ?) ON CONFLICT (id) DO UPDATE SET body = excluded.body",
+                           (json.dumps(config, ensure_ascii=False),))
+
+def create_leaderboard_storage(backend):
+    journal_storage = JournalStorage(LeaderboardJournal(leaderboard_file, leaderboard_journal_file), correct_answers_file)
+    if backend == "sqlite": return SQLiteStorage(leaderboard_db_file, legacy_storage=journal_storage)
+    if backend != "journal": print(f"Unknown storage backend '{backend}', using the journal.")
+    return journal_storage
+
+leaderboard_storage = create_leaderboard_storage(STORAGE_BACKEND)
+
+class SubmissionDedupeCache:
+    # Device submission IDs (see submission_id_from_payload) that are already committed, each for SUBMISSION_DEDUPE_TTL seconds
+    # and at most max_entries of them (oldest dropped first). Producers check it before queueing a result, so a
+    # client retry after a lost response is acked without scoring or writing anything. Filled from storage at load.
+    def __init__(self, ttl=SUBMISSION_DEDUPE_TTL, max_entries=SUBMISSION_DEDUPE_MAX):
+        self.ttl = ttl; self.max_entries = max_entries
+        self._seen = {} # id -> committed at, in commit order
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def load(self, submission_ids):
+        with self._lock: self._seen = {}
+        for s_id, at in sorted(submission_ids.items(), key=lambda item: item[1]): self.remember(s_id, at)
+
+    def _expire(self, now):
+        while self._seen:
+            oldest_id = next(iter(self._seen))
+            if self._seen[oldest_id] >= now - self.ttl and len(self._seen) <= self.max_entries: break
+            del self._seen[oldest_id]
+
+    def remember(self, submission_id, at):
+        with self._lock:
+            self._seen[submission_id] = at
+            self._expire(time.time())
+
+    def is_duplicate(self, submission_id):
+        if submission_id is None: return False
+        with self._lock:
+            self._expire(time.time())
+            if submission_id not in self._seen: return False
+            self.duplicates += 1
+            return True
+
+submission_dedupe = SubmissionDedupeCache()
+
+class IngestAdmission:
+    # Admission control in front of the ingest queue, checked by POST /add before it queues a result (serial results
+    # are never refused, see process_serial_line). Each source has a token bucket (rate tokens/s, up to burst); a source with an empty bucket,
+    # or any source while the queue is full, is refused at once with the seconds to wait, instead of blocking on
+    # the queue until the client times out. The counters show whether capacity kept up during an event.
+    def __init__(self, rate=INGEST_RATE_PER_SOURCE, burst=INGEST_BURST_PER_SOURCE, max_sources=INGEST_ADMISSION_MAX_SOURCES):
+        self.rate = rate; self.burst = burst; self.max_sources = max_sources
+        self._buckets = {} # source -> (tokens, last refill), least recently seen first
+        self._lock = threading.Lock()
+        self.admitted = 0; self.shed_rate_limited = 0; self.shed_queue_full = 0
+
+    def admit(self, source):
+        # 0 if the result may be queued, else the Retry-After in whole seconds
+        if leaderboard_state.queue_depth() >= leaderboard_state.queue_max:
+            with self._lock: self.shed_queue_full += 1
+            return INGEST_QUEUE_RETRY_AFTER
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(source, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[source] = (tokens, now); self.shed_rate_limited += 1
+                return max(1, int((1 - tokens) / self.rate + 0.999))
+            self._buckets[source] = (tokens - 1, now); self.admitted += 1
+            while len(self._buckets) > self.max_sources: self._buckets.pop(next(iter(self._buckets)))
+            return 0
+
+    def stats(self):
+        return {"admitted": self.admitted, "shed_rate_limited": self.shed_rate_limited, "shed_queue_full": self.shed_queue_full,
+                "tracked_sources": len(self._buckets)}
+
+ingest_admission = IngestAdmission()
+
+def submission_id_from_payload(payload):
+    # "<device_id>:<seq>:<digest of name, time, category>" from a device payload, or None for clients that don't send
+    # device_id and seq (the run ID; older firmware sends a run counter). The digest makes a retry a duplicate only
+    # if it carries the same result, so a run whose ID repeats (e.g. a counter reset with the SD card) isn't dropped.
+    device_id, seq = payload.get("device_id"), payload.get("seq")
+    if not isinstance(device_id, str) or not device_id or len(device_id) > 64: return None
+    if isinstance(seq, bool) or not isinstance(seq, (int, str)) or seq == "" or len(str(seq)) > 64: return None
+    try: result_fields = f'{str(payload.get("name", "")).strip()}\0{float(payload.get("time"))!r}\0{payload.get("category_uid")}'
+    except (TypeError, ValueError): return None
+    return f"{device_id}:{seq}:{hashlib.blake2s(result_fields.encode('utf-8'), digest_size=6).hexdigest()}"
+
+def leaderboard_sort_key(entry):
+    return (entry.get("disqualified", False), entry.get("time", 0), entry.get("penalty", 0))
+
+class SortedChunkList:
+    # Immutable sorted sequence of (sort_key, entry) pairs kept as a tuple of chunk tuples plus each chunk's last key.
+    # insert()/remove() return a new list that shares every untouched chunk with the old one, so a new version
+    # costs O(chunk size + number of chunks) instead of a copy of the whole list. starts holds each chunk's first
+    # position, so rank() and positional access are two bisects instead of a scan.
+    __slots__ = ("chunks", "maxes", "size", "starts")
+
+    def __init__(self, chunks=(), maxes=(), size=0):
+        self.chunks = chunks; self.maxes = maxes; self.size = size
+        self.starts = tuple(itertools.accumulate((len(chunk) for chunk in chunks[:-1]), initial=0)) if chunks else ()
+
+    @classmethod
+    def from_sorted(cls, pairs, chunk_size=LEADERBOARD_CHUNK_SIZE):
+        chunks = tuple(tuple(pairs[i:i + chunk_size]) for i in range(0, len(pairs), chunk_size))
+        return cls(chunks, tuple(chunk[-1][0] for chunk in chunks), len(pairs))
+
+    def insert(self, pair, chunk_size=LEADERBOARD_CHUNK_SIZE):
+        if not self.chunks: return SortedChunkList(((pair,),), (pair[0],), 1)
+        c_idx = min(bisect.bisect_left(self.maxes, pair[0]), len(self.chunks) - 1)
+        chunk = list(self.chunks[c_idx])
+        bisect.insort(chunk, pair, key=lambda p: p[0])
+        if len(chunk) > 2 * chunk_size: # Split so a single chunk never grows without bound
+            new_chunks = (tuple(chunk[:chunk_size]), tuple(chunk[chunk_size:]))
+        else: new_chunks = (tuple(chunk),)
+        return SortedChunkList(self.chunks[:c_idx] + new_chunks + self.chunks[c_idx + 1:],
+                               self.maxes[:c_idx] + tuple(c[-1][0] for c in new_chunks) + self.maxes[c_idx + 1:],
+                               self.size + 1)
+
+    def remove(self, sort_key):
+        c_idx = bisect.bisect_left(self.maxes, sort_key)
+        chunk = self.chunks[c_idx]
+        p_idx = bisect.bisect_left(chunk, sort_key, key=lambda p: p[0])
+        new_chunk = chunk[:p_idx] + chunk[p_idx + 1:]
+        new_chunks, new_maxes = ((new_chunk,), (new_chunk[-1][0],)) if new_chunk else ((), ())
+        return SortedChunkList(self.chunks[:c_idx] + new_chunks + self.chunks[c_idx + 1:],
+                               self.maxes[:c_idx] + new_maxes + self.maxes[c_idx + 1:], self.size - 1)
+
+    def rank(self, sort_key):
+        # Number of pairs ordered before sort_key
+        c_idx = bisect.bisect_left(self.maxes, sort_key)
+        if c_idx == len(self.chunks): return self.size
+        return self.starts[c_idx] + bisect.bisect_left(self.chunks[c_idx], sort_key, key=lambda p: p[0])
+
+    def __getitem__(self, position):
+        c_idx = bisect.bisect_right(self.starts, position) - 1
+        return self.chunks[c_idx][position - self.starts[c_idx]]
+
+    def iter_from(self, offset):
+        # Pairs from position offset on; skips whole chunks instead of walking them
+        if offset >= self.size: return
+        c_idx = max(bisect.bisect_right(self.starts, offset) - 1, 0)
+        yield from self.chunks[c_idx][max(offset - self.starts[c_idx], 0):]
+        for chunk in self.chunks[c_idx + 1:]: yield from chunk
+
+    def __iter__(self):
+        for chunk in self.chunks: yield from chunk
+
+    def __len__(self):
+        return self.size
+
+_EMPTY_CHUNK_LIST = SortedChunkList()
+
+def normalize_search_text(text):
+    # Casefolded, without diacritics and with single spaces: "  Žofia ČIERNA" -> "zofia cierna"
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return " ".join("".join(ch for ch in decomposed if not unicodedata.combining(ch)).split())
+
+class NameSearchIndex:
+    # Participant name search over normalize_search_text() forms. Queries of 3+ characters are substring
+    # matches: intersect the query's trigram postings (trigram -> {(name, category), ...}), smallest first, then
+    # confirm on the candidates. Shorter queries match word prefixes by bisecting a sorted (word, key) list.
+    # Keys are only ever added (a participant's name does not change), so every snapshot since the last reset
+    # shares one index; the lock keeps readers off the sets while the writer adds to them.
+    def __init__(self, keys=()):
+        self._lock = threading.Lock()
+        self._normalized = {}; self._trigrams = {}; self._words = []
+        for key in keys: self._words.extend(self._add(key))
+        self._words.sort()
+
+    def _add(self, key):
+        normalized = normalize_search_text(key[0])
+        self._normalized[key] = normalized
+        for i in range(len(normalized) - 2): self._trigrams.setdefault(normalized[i:i + 3], set()).add(key)
+        return [(word, key) for word in set(normalized.split())]
+
+    def add(self, key):
+        with self._lock:
+            if key in self._normalized: return
+            for word_key in self._add(key): bisect.insort(self._words, word_key)
+
+    def search(self, query, category_key="All Categories", limit=None):
+        # (number of matches, the first limit matching (name, category) keys in normalized name order)
+        query = normalize_search_text(query)
+        if not query: return 0, []
+        with self._lock:
+            if len(query) >= 3:
+                postings = sorted((self._trigrams.get(query[i:i + 3], ()) for i in range(len(query) - 2)), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:]) if postings[0] else ()
+                if len(query) == 3: matches = set(candidates) # The trigram itself is the match
+                else: matches = {key for key in candidates if query in self._normalized[key]}
+            else:
+                matches = set(); w_idx = bisect.bisect_left(self._words, (query,))
+                while w_idx < len(self._words) and self._words[w_idx][0].startswith(query):
+                    matches.add(self._words[w_idx][1]); w_idx += 1
+            if category_key not in ("All Categories", "", None): matches = {key for key in matches if key[1] == category_key}
+            order = lambda key: (self._normalized[key], key)
+            return len(matches), sorted(matches, key=order) if limit is None else heapq.nsmallest(limit, matches, key=order)
+
+class BoardSnapshot:
+    # One immutable version of the board: per-category SortedChunkLists and the store version they belong to.
+    # Taking one is a single attribute read; it stays valid (and unchanged) however many writes follow.
+    # changes is the bounded changelog: (version, pair) for the last puts, oldest first. Any version from
+    # changes_floor on can be brought up to this one from it (a reset or trimming moves the floor up).
+    # participants maps (stripped name, category) -> [(version, pair), ...] and is shared (append-only) by every
+    # snapshot since the last reset; find() picks the newest pair that is not newer than this snapshot.
+    # search_index (NameSearchIndex) is shared the same way; its hits are resolved through find().
+    __slots__ = ("version", "by_category", "changes", "changes_floor", "participants", "search_index")
+
+    def __init__(self, version, by_category, changes=(), changes_floor=None, participants=None, search_index=None):
+        self.version = version; self.by_category = by_category
+        self.changes = changes; self.changes_floor = version if changes_floor is None else changes_floor
+        self.participants = participants if participants is not None else {}
+        self.search_index = search_index if search_index is not None else NameSearchIndex()
+
+    def __len__(self):
+        return sum(len(pairs) for pairs in self.by_category.values())
+
+    def _lists(self, category_key):
+        if category_key == "All Categories" or not category_key: return list(self.by_category.values())
+        return [self.by_category.get(category_key, _EMPTY_CHUNK_LIST)]
+
+    def count(self, category_key="All Categories"):
+        return sum(len(pairs) for pairs in self._lists(category_key))
+
+    def rank(self, sort_key, category_key="All Categories"):
+        # 0-based place of sort_key in the category ("All Categories": summed over the per-category lists)
+        return sum(pairs.rank(sort_key) for pairs in self._lists(category_key))
+
+    def pair_before(self, sort_key, category_key="All Categories"):
+        # The pair ranked directly above sort_key (the latest predecessor across the category lists), or None
+        before = [pairs[rank - 1] for pairs in self._lists(category_key) for rank in (pairs.rank(sort_key),) if rank > 0]
+        return max(before, key=lambda p: p[0]) if before else None
+
+    def iter_pairs(self, category_key="All Categories", offset=0):
+        # Lazy, already-sorted (sort_key, entry) pairs from position offset on; "All Categories" is a k-way merge
+        # of the per-category lists, each started where the merged order's pair #offset falls
+        lists = self._lists(category_key)
+        if len(lists) == 1: return lists[0].iter_from(offset) if offset else iter(lists[0])
+        starts = self._merge_starts(lists, offset) if offset else [0] * len(lists)
+        return heapq.merge(*(pairs.iter_from(start) for pairs, start in zip(lists, starts)), key=lambda p: p[0])
+
+    @staticmethod
+    def _merge_starts(lists, offset):
+        # Per-list positions that split the merged order at offset: binary search each list for the pair whose
+        # summed rank is offset (keys are unique, so exactly one list holds it). O(lists^2 * log^2 n).
+        if offset >= sum(len(pairs) for pairs in lists): return [len(pairs) for pairs in lists]
+        for pairs in lists:
+            lo, hi = 0, len(pairs)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                merged_rank = sum(other.rank(pairs[mid][0]) for other in lists)
+                if merged_rank < offset: lo = mid + 1
+                elif merged_rank > offset: hi = mid
+                else: return [other.rank(pairs[mid][0]) for other in lists]
+        raise AssertionError("offset not found in merged order")
+
+    def find(self, name, category_key="All Categories"):
+        # The participant's pair(s) in this snapshot - one per category they are in for "All Categories"
+        keys = [(name.strip(), cat_key) for cat_key in self.by_category] if category_key in ("All Categories", "", None) else [(name.strip(), category_key)]
+        found = []
+        for key in keys:
+            for version, pair in reversed(self.participants.get(key, ())):
+                if version <= self.version: found.append(pair); break
+        return sorted(found, key=lambda p: p[0])
+
+    def iter_entries(self, category_key="All Categories"):
+        return (pair[1] for pair in self.iter_pairs(category_key))
+
+    def changes_since(self, since_version, category_key="All Categories"):
+        # Current pairs put after since_version (one per participant), or None if the changelog cannot tell
+        if since_version == self.version: return []
+        if not self.changes_floor <= since_version < self.version: return None
+        latest = {}
+        for _, pair in self.changes[bisect.bisect_right(self.changes, since_version, key=lambda change: change[0]):]:
+            if category_key in ("All Categories", "", None) or pair[1].get("category") == category_key:
+                latest[pair[0][3]] = pair # Keyed by seq, which a participant keeps across replacements
+        return list(latest.values())
+
+    def view(self, category_key="All Categories"):
+        return list(self.iter_entries(category_key))
+
+class LeaderboardStore:
+    # Copy-on-write board. Every change builds a new BoardSnapshot that shares all untouched chunks with the
+    # previous one and publishes it with one reference assignment, so readers take snapshot() without locks or
+    # copies. sort_key is (disqualified, time, penalty, seq); seq keeps ties in arrival order and makes keys unique.
+    # Entries are never mutated after insertion - a replacement stores a new dict. The (stripped name, category)
+    # -> [(version, pair), ...] index is appended to before the snapshot that contains the new pair is published,
+    # so snapshots can share it; version increases with every change and keys the render caches.
+    def __init__(self, category_keys):
+        self._lock = threading.RLock() # Serializes writers only
+        self._category_keys = list(category_keys)
+        self._root = BoardSnapshot(0, {})
+        self.reset([])
+
+    @property
+    def version(self):
+        return self._root.version
+
+    def snapshot(self):
+        return self._root
+
+    def reset(self, entries):
+        self.install(self.prepare(entries))
+
+    def prepare(self, entries):
+        # Builds the board a reset to entries would publish, without touching the store, so a worker thread can do
+        # the sorting and indexing; install() then swaps it in
+        index = {}; seq = 0
+        for entry in entries: # Same merge rules as upsert, applied to a plain dict before chunking
+            key = (entry.get("name", "").strip(), entry.get("category"))
+            existing = index.get(key)
+            if existing is not None and leaderboard_sort_key(entry) >= existing[0][:3]: continue
+            if existing is None: seq += 1
+            index[key] = (leaderboard_sort_key(entry) + (existing[0][3] if existing is not None else seq,), entry)
+        by_category = {k: [] for k in self._category_keys}
+        for pair in index.values(): by_category.setdefault(pair[1].get("category"), []).append(pair)
+        chunk_lists = {k: SortedChunkList.from_sorted(sorted(pairs, key=lambda p: p[0])) for k, pairs in by_category.items()}
+        return index, chunk_lists, NameSearchIndex(index), seq
+
+    def install(self, prepared):
+        index, chunk_lists, search_index, seq = prepared
+        with self._lock:
+            self._seq = seq
+            version = self._root.version + 1
+            self._index = {key: [(version, pair)] for key, pair in index.items()}
+            self._search_index = search_index
+            self._root = BoardSnapshot(version, chunk_lists, participants=self._index, search_index=search_index)
+
+    def _next_seq(self):
+        self._seq += 1; return self._seq
+
+    def upsert(self, entry):
+        # Insert, or replace the same participant's entry if the new result is better. Returns False if not stored.
+        key = (entry.get("name", "").strip(), entry.get("category"))
+        with self._lock:
+            root = self._root
+            pairs = root.by_category.get(key[1], _EMPTY_CHUNK_LIST)
+            history = self._index.get(key)
+            existing = history[-1][1] if history else None
+            if existing is not None:
+                if leaderboard_sort_key(entry) >= existing[0][:3]: return False
+                pairs = pairs.remove(existing[0])
+                seq = existing[0][3] # Replacement keeps the participant's original arrival order among ties
+            else: seq = self._next_seq()
+            pair = (leaderboard_sort_key(entry) + (seq,), entry)
+            by_category = dict(root.by_category); by_category[key[1]] = pairs.insert(pair)
+            if history: history.append((root.version + 1, pair)) # Older snapshots keep seeing the previous pair
+            else: self._index[key] = [(root.version + 1, pair)]; self._search_index.add(key)
+            changes, changes_floor = root.changes, root.changes_floor
+            dropped = len(changes) - (LEADERBOARD_CHANGELOG_MAX - 1)
+            if dropped > 0: changes_floor = max(changes_floor, changes[dropped - 1][0]); changes = changes[dropped:]
+            self._root = BoardSnapshot(root.version + 1, by_category, changes + ((root.version + 1, pair),), changes_floor,
+                                       self._index, self._search_index) # Publish
+            return True
+
+    def get(self, name, category_key):
+        history = self._index.get((name.strip(), category_key))
+        return history[-1][1][1] if history else None
+
+    def __len__(self):
+        return len(self._index)
+
+    def iter_pairs(self, category_key="All Categories"):
+        return self._root.iter_pairs(category_key)
+
+    def iter_entries(self, category_key="All Categories"):
+        return self._root.iter_entries(category_key)
+
+    def view(self, category_key="All Categories"):
+        return self._root.view(category_key)
+
+leaderboard_store = LeaderboardStore(CATEGORY_NAMES_CONFIG_KEYS)
+
+# Admin "freeze board": (BoardSnapshot, frozen_at) served to the public pages while ingestion continues, or None
+frozen_board = None
+
+def public_board():
+    frozen = frozen_board
+    return frozen[0] if frozen is not None else leaderboard_store.snapshot()
+
+class LeaderboardEventBroker:
+    # Wakes the /events streams whenever the board or the config changes.
+    # Streams re-read the cached table render themselves, so publishing costs one Event.set() on the loop.
+    def __init__(self):
+        self.generation = 0
+        self._loop = None
+        self._changed = None
+
+    def bind(self, loop):
+        self._loop = loop; self._changed = asyncio.Event()
+
+    def publish(self): # Any thread
+        self.generation += 1
+        if self._loop is not None: self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, seen_generation, timeout):
+        changed = self._changed
+        if self.generation == seen_generation:
+            try: await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError: pass
+        return self.generation
+
+leaderboard_events = LeaderboardEventBroker()
+
+class LeaderboardStateOwner:
+    # Single owner of the leaderboard and config state, and the group committer for results.
+    # Once bound to the event loop, producers put items on one bounded queue: results (add_to_leaderboard) and other
+    # mutations (functions decorated with @runs_on_state_owner). The owner task drains the queue in batches, scores and
+    # merges every result in the batch, persists the stored ones with a single journal write and publishes one change.
+    # Before binding (startup, scripts) everything simply runs inline.
+    def __init__(self, queue_max=INGEST_QUEUE_MAX, batch_max=INGEST_BATCH_MAX, batch_linger=INGEST_BATCH_LINGER):
+        self._loop = None
+        self._loop_thread_id = None
+        self._queue = None
+        self._applying = False
+        self.queue_max = queue_max; self.batch_max = batch_max; self.batch_linger = batch_linger
+        self.batches_committed = 0; self.results_committed = 0; self.journal_writes = 0
+        self.coalesced_writes = 0 # Writes saved by group commit: results that shared a write with an earlier one
+        self.last_batch_size = 0; self.max_batch_size = 0; self.deferred_puts = 0
+
+    def bind(self, loop):
+        self._loop = loop; self._loop_thread_id = threading.get_ident(); self._queue = asyncio.Queue(self.queue_max)
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth(), "queue_max": self.queue_max, "batch_max": self.batch_max,
+            "last_batch_size": self.last_batch_size, "max_batch_size": self.max_batch_size,
+            "batches_committed": self.batches_committed, "results_committed": self.results_committed,
+            "journal_writes": self.journal_writes, "coalesced_writes": self.coalesced_writes,
+            "deferred_puts": self.deferred_puts, "duplicate_submissions": submission_dedupe.duplicates,
+            **ingest_admission.stats(),
+        }
+
+    def _enqueue(self, item):
+        if threading.get_ident() == self._loop_thread_id: # Loop callbacks must not block
+            try: self._queue.put_nowait(item)
+            except asyncio.QueueFull: # Keep the submission; it waits for room without stalling the loop
+                self.deferred_puts += 1; self._loop.create_task(self._queue.put(item))
+            return None
+        asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop).result() # Blocks the producer while full
+        return item[2].result() # Worker/serial threads wait for the commit
+
+    def call(self, fn, *args):
+        # fn may return a coroutine to finish slow I/O off the loop (see run()); the owner awaits it before moving on
+        if self._loop is None or (self._applying and threading.get_ident() == self._loop_thread_id):
+            outcome = fn(*args) # Not started yet, or a mutation calling another one on the owner itself
+            return asyncio.run(outcome) if asyncio.iscoroutine(outcome) and self._loop is None else outcome
+        return self._enqueue(("call", (fn, args), concurrent.futures.Future()))
+
+    def submit_result(self, submission):
+        # submission = (name, time_taken, answers, category_key, submission_id, received_at); True once stored and persisted
+        if self._loop is None or (self._applying and threading.get_ident() == self._loop_thread_id):
+            stored_entry = apply_submission(*submission)
+            records = [{"op": "put", "entry": stored_entry}] if stored_entry is not None else []
+            if submission[4] is not None: records.append({"op": "seen", "id": submission[4], "at": time.time()})
+            if records: persist_leaderboard_records(records); self._count_write(records)
+            if submission[4] is not None: submission_dedupe.remember(submission[4], records[-1]["at"])
+            ingest_lag_seconds.observe(time.perf_counter() - submission[5])
+            if stored_entry is not None: leaderboard_events.publish()
+            return stored_entry is not None
+        return self._enqueue(("result", submission, concurrent.futures.Future()))
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        while len(batch) < self.batch_max:
+            try: batch.append(self._queue.get_nowait()); continue
+            except asyncio.QueueEmpty: pass
+            if len(batch) > 1 or self.batch_linger <= 0: break # Already coalescing; don't add latency
+            try: batch.append(await asyncio.wait_for(self._queue.get(), self.batch_linger))
+            except asyncio.TimeoutError: break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            self.last_batch_size = len(batch); self.max_batch_size = max(self.max_batch_size, len(batch))
+            pending_records = []; settled = []
+            self._applying = True
+            try:
+                for kind, payload, result_future in batch:
+                    if kind == "result":
+                        try: stored_entry = apply_submission(*payload)
+                        except Exception as e_apply: result_future.set_exception(e_apply); continue
+                        if stored_entry is not None: pending_records.append({"op": "put", "entry": stored_entry})
+                        if payload[4] is not None: # Marked in the same commit, so the ID is durable iff the result is
+                            pending_records.append({"op": "seen", "id": payload[4], "at": time.time()})
+                        settled.append((result_future, stored_entry is not None, payload[4], payload[5]))
+                        continue
+                    if pending_records: # Keep journal order: earlier results must hit the disk before e.g. a clear
+                        persist_leaderboard_records(pending_records); self._count_write(pending_records); pending_records = []
+                    fn, args = payload
+                    try:
+                        outcome = fn(*args)
+                        if asyncio.iscoroutine(outcome): # Slow follow-up (a storage rewrite): the loop keeps serving while
+                            self._applying = False       # it runs, the owner starts nothing else until it is done
+                            try: outcome = await outcome
+                            finally: self._applying = True
+                        result_future.set_result(outcome)
+                    except Exception as e_apply:
+                        result_future.set_exception(e_apply); print(f"Error applying {fn.__name__}: {e_apply}")
+            finally: self._applying = False
+            if pending_records:
+                await loop.run_in_executor(None, persist_leaderboard_records, pending_records) # The loop keeps serving meanwhile
+                board_records = self._count_write(pending_records)
+                if board_records > 1: print(f"Group commit: {board_records} results persisted with one journal write.")
+            self.batches_committed += 1
+            committed_at = time.time(); committed_perf = time.perf_counter()
+            for result_future, stored, submission_id, received_at in settled:
+                if submission_id is not None: submission_dedupe.remember(submission_id, committed_at)
+                ingest_lag_seconds.observe(committed_perf - received_at)
+                result_future.set_result(stored)
+            if any(settled_item[1] for settled_item in settled): leaderboard_events.publish()
+
+    def _count_write(self, records):
+        # "seen" records ride along with the results; only board records ("put"/"clear") count as results
+        results = sum(1 for record in records if record.get("op") == "put")
+        self.journal_writes += 1; self.results_committed += results; self.coalesced_writes += max(0, results - 1)
+        return sum(1 for record in records if record.get("op") in ("put", "clear"))
+
+leaderboard_state = LeaderboardStateOwner()
+
+def runs_on_state_owner(fn):
+    @functools.wraps(fn)
+    def owned(*args): return leaderboard_state.call(fn, *args)
+    return owned
+
 def load_leaderboard():
-    global leaderboard_data
     try:
-        if os.path.exists(leaderboard_file):
-            with open(leaderboard_file, "r", encoding="utf-8") as f:
-                loaded_data = json.load(f)
-                if isinstance(loaded_data, list):
-                    leaderboard_data = loaded_data
-                    for entry in leaderboard_data:
-                        entry.setdefault("disqualified", False)
-                        entry.setdefault("original_time", entry.get("time", 0) - entry.get("penalty", 0))
-                    print("Leaderboard loaded from file.")
-                else: leaderboard_data = [] # File exists but not a list
-        else: leaderboard_data = [] # File doesn't exist
+        entries, compact_now = leaderboard_storage.load_entries()
+        for entry in entries:
+            entry.setdefault("disqualified", False)
+            entry.setdefault("original_time", entry.get("time", 0) - entry.get("penalty", 0))
+        entries.sort(key=leaderboard_sort_key) # Stable: stored order decides ties
+        leaderboard_store.reset(entries)
+        submission_dedupe.load(leaderboard_storage.load_submission_ids())
+        print(f"Leaderboard loaded from {leaderboard_storage.name} storage ({len(leaderboard_store)} entries).")
+        if compact_now: leaderboard_storage.replace_entries(leaderboard_store.view())
     except Exception as e:
-        print(f"Error loading leaderboard: {e}. Starting fresh."); leaderboard_data = []
+        print(f"Error loading leaderboard: {e}. Starting fresh."); leaderboard_store.reset([])
 
+@runs_on_state_owner
+@timed(save_leaderboard_seconds)
 def save_leaderboard(data_to_save):
-    global leaderboard_data
+    # Full rewrite (journal: snapshot + truncation); the per-result path writes records instead
     try:
         if not isinstance(data_to_save, list): return # Safety
-        with open(leaderboard_file, "w", encoding="utf-8") as f:
-            json.dump(data_to_save, f, ensure_ascii=False, indent=4)
-        leaderboard_data = data_to_save # Update global after successful save
+        timed(storage_write_seconds, "replace")(leaderboard_storage.replace_entries)(data_to_save)
+        leaderboard_store.reset(data_to_save) # Update store after successful save
+        leaderboard_events.publish()
         print("Leaderboard saved to file.")
     except Exception as e: print(f"Error saving leaderboard: {e}")
 
+def persist_leaderboard_records(records):
+    # One storage write for inserts/replaces already applied to the store; full rewrite if the write fails.
+    # Runs in an executor while the state owner awaits it, so it must not go through save_leaderboard (that would
+    # queue on the owner and wait for it: a deadlock); the store already holds the records, only storage is behind.
+    try:
+        if timed(storage_write_seconds, "records")(leaderboard_storage.write_records)(records):
+            timed(storage_write_seconds, "replace")(leaderboard_storage.replace_entries)(leaderboard_store.view())
+    except Exception as e:
+        print(f"Error writing results to {leaderboard_storage.name} storage: {e}. Falling back to full rewrite.")
+        try: timed(storage_write_seconds, "replace")(leaderboard_storage.replace_entries)(leaderboard_store.view())
+        except Exception as e_rewrite: print(f"Error rewriting {leaderboard_storage.name} storage: {e_rewrite}")
+
+@runs_on_state_owner
 def clear_leaderboard():
-    global leaderboard_data
-    leaderboard_data = []; save_leaderboard(leaderboard_data)
+    save_leaderboard([])
     print("Leaderboard cleared.")
 
-def add_to_leaderboard(name, time_taken, answers, category_key):
-    global leaderboard_data, correct_answers_config, PENALTY_PER_INCORRECT, NUM_QUESTIONS_PER_CATEGORY, CATEGORY_DISPLAY_NAMES
-
-    category_correct_answers = get_correct_answers_for_category(correct_answers_config, category_key)
-    penalty_seconds = 0
-    disqualified = False
-    expected_num_questions = NUM_QUESTIONS_PER_CATEGORY.get(category_key, GENERAL_MAX_QUESTIONS)
-    if expected_num_questions <= 0: expected_num_questions = 1 # Safety net
-
-    if len(answers) < expected_num_questions:
-        disqualified = True
-        for q_num in range(1, expected_num_questions + 1):
-            if str(q_num) not in answers: penalty_seconds += PENALTY_PER_INCORRECT
-    else:
-        for q_num in range(1, expected_num_questions + 1):
-            q_str = str(q_num)
-            submitted_ans = answers.get(q_str)
-            correct_ans = category_correct_answers.get(q_str)
-            if submitted_ans is None or (correct_ans is not None and submitted_ans != correct_ans):
-                penalty_seconds += PENALTY_PER_INCORRECT
-
+@runs_on_state_owner
+def freeze_board():
+    # Public pages keep showing the board as it is now; results are still stored, journaled and exported
+    global frozen_board
+    frozen_board = (leaderboard_store.snapshot(), time.time())
+    leaderboard_events.publish()
+    print(f"Leaderboard frozen at version {frozen_board[0].version}.")
+
+@runs_on_state_owner
+def unfreeze_board():
+    global frozen_board
+    frozen_board = None
+    leaderboard_events.publish()
+    print("Leaderboard unfrozen.")
+
+@timed(add_result_seconds)
+def add_to_leaderboard(name, time_taken, answers, category_key, submission_id=None, received_at=None):
+    # Producers (serial, POST /add, manual add) call this; the state owner scores, merges and group-commits it.
+    # submission_id (device_id:seq:result digest) is remembered with the commit so a retried submission can be acked unapplied.
+    # received_at (perf_counter) is when the producer got the result; the commit observes the ingest lag from it.
+    # Returns True if the result was stored (None when queued from an event loop callback).
+    return leaderboard_state.submit_result((name, time_taken, answers, category_key, submission_id,
+                                            time.perf_counter() if received_at is None else received_at))
+
+@timed(apply_submission_seconds)
+def apply_submission(name, time_taken, answers, category_key, submission_id=None, received_at=None):
+    # Runs on the state owner: score one submission and merge it into the store. Returns the stored entry or None.
+    cfg = active_config
+    answer_codes = encode_answer_codes(answers, cfg.general_max_questions) # Kept so the entry can be rescored when the key changes
+    penalty_seconds, disqualified = cfg.scoring_table(category_key).score(answer_codes)
     penalized_time = time_taken + penalty_seconds
     new_entry = {
         "name": name.strip(), "time": penalized_time, "original_time": time_taken,
-        "penalty": penalty_seconds, "category": category_key, "disqualified": disqualified
+        "penalty": penalty_seconds, "category": category_key, "disqualified": disqualified,
+        "answers": answer_codes,
     }
 
-    current_lb_copy = list(leaderboard_data)
-    existing_idx = -1
-    for i, entry in enumerate(current_lb_copy):
-        if entry["name"].strip() == new_entry["name"] and entry.get("category") == new_entry["category"]:
-            existing_idx = i; break
-    
-    if existing_idx != -1:
-        if (new_entry["disqualified"], new_entry["time"], new_entry["penalty"]) < \
-           (current_lb_copy[existing_idx]["disqualified"], current_lb_copy[existing_idx]["time"], current_lb_copy[existing_idx]["penalty"]):
-            current_lb_copy[existing_idx] = new_entry
-        else: return # Not a better score
-    else:
-        current_lb_copy.append(new_entry)
-
-    current_lb_copy.sort(key=lambda x: (x["disqualified"], x["time"], x["penalty"]))
-    save_leaderboard(current_lb_copy)
-    cat_display = CATEGORY_DISPLAY_NAMES.get(category_key, category_key)
+    if not leaderboard_store.upsert(new_entry): return None # Not a better score
+    cat_display = cfg.category_display_names.get(category_key, category_key)
     print(f"Leaderboard updated: {new_entry['name']} in {cat_display}, Time: {format_time(penalized_time, disqualified)}")
+    return new_entry
+
+# Submitted answers are stored as one code per question ("AB-D?..."): '-' = not answered,
+# '?' = answered with something other than A-D (counts as present but never matches a key)
+ANSWER_CODE_MISSING = "-"
+
+_ANSWER_CODES = {"A": "A", "B": "B", "C": "C", "D": "D", None: ANSWER_CODE_MISSING}
+
+@functools.lru_cache(maxsize=8) # One width per general_max_questions value in use
+def question_keys(width):
+    return tuple(str(q_num) for q_num in range(1, width + 1))
+
+def encode_answer_codes(answers, width):
+    # width is the config's general_max_questions: no category scores a question past it, so keys beyond it (or
+    # not numbers at all) are ignored - a client can't make the stored code string, or this cache, any larger
+    get_answer = answers.get
+    return "".join([_ANSWER_CODES.get(get_answer(q_key), "?") for q_key in question_keys(width)])
+
+class ScoringTable:
+    # Immutable per-category scoring data compiled from the config: the answer key as one char per question
+    # ('-' = no correct answer set, so any answer counts), the positions that actually have a key, the question
+    # count, the penalty and the section boundaries as (name, first_question, last_question).
+    __slots__ = ("category_key", "num_questions", "key_codes", "checked", "penalty", "sections")
+
+    def __init__(self, category_key, num_questions, key_codes, penalty, sections):
+        self.category_key = category_key
+        self.num_questions = num_questions
+        self.key_codes = key_codes
+        self.checked = tuple((q_idx, k) for q_idx, k in enumerate(key_codes) if k != ANSWER_CODE_MISSING)
+        self.penalty = penalty
+        self.sections = sections
+
+    def score(self, answer_codes):
+        # Returns (penalty_seconds, disqualified) - same rules as before: a sheet with fewer answers than questions
+        # is disqualified and penalized per missing answer, otherwise per missing or wrong answer.
+        num_q = self.num_questions
+        scored = answer_codes[:num_q]
+        missing = num_q - len(scored) + scored.count(ANSWER_CODE_MISSING)
+        if len(answer_codes) - answer_codes.count(ANSWER_CODE_MISSING) < num_q: return missing * self.penalty, True
+        wrong = missing
+        for q_idx, correct in self.checked:
+            if q_idx < len(scored) and scored[q_idx] != correct and scored[q_idx] != ANSWER_CODE_MISSING: wrong += 1
+        return wrong * self.penalty, False
+
+def compile_scoring_table(category_key, num_questions, category_answers, penalty, sections):
+    num_q = max(1, num_questions) # Safety net: at least 1
+    key_codes = "".join(ans if (ans := category_answers.get(str(q_num))) in ("A", "B", "C", "D") else ANSWER_CODE_MISSING
+                        for q_num in range(1, num_q + 1))
+    boundaries, next_q = [], 1
+    for sec_name, sec_num_q in sections:
+        boundaries.append((sec_name, next_q, next_q + sec_num_q - 1))
+        next_q += sec_num_q
+    return ScoringTable(category_key, num_q, key_codes, penalty, tuple(boundaries))
 
 # --- Formatting and HTML/CSV Generation ---
+@functools.lru_cache(maxsize=8192) # Same few thousand times are formatted over and over
 def format_time(seconds, disqualified=False):
     if not isinstance(seconds, (int, float)) or seconds < 0: seconds = 0
     h = int(seconds // 3600); m = int((seconds % 3600) // 60); s = int(seconds % 60)
     time_str = f"{h:02d}:{m:02d}:{s:02d}"
     return f"D: {time_str}" if disqualified else time_str
 
-def generate_leaderboard_csv(data_to_export):
-    global CATEGORY_DISPLAY_NAMES
-    csv_output = "Rank;Name;Category;Original Time;Penalty;Final Time;Status\n"
+# --- Exports (generators of byte chunks; the HTTP layer streams them and caches the finished result) ---
+def iter_export_rows(data_to_export, cfg):
+    # (rank, name, category display name, entry) for every exported row
     for i, entry in enumerate(data_to_export):
         cat_key = entry.get("category", "N/A")
-        cat_display = CATEGORY_DISPLAY_NAMES.get(cat_key, cat_key)
+        yield i + 1, entry.get("name", "N/A"), cfg.category_display_names.get(cat_key, cat_key), entry
+
+def iter_leaderboard_csv(data_to_export, cfg):
+    lines = ["\ufeffRank;Name;Category;Original Time;Penalty;Final Time;Status\n"] # BOM for Excel
+    size = 0
+    for rank, name, cat_display, entry in iter_export_rows(data_to_export, cfg):
         status = "Disqualified" if entry.get("disqualified", False) else "Qualified"
-        csv_output += (
-            f"{i+1};{entry.get('name','N/A').replace(';',',')};{cat_display};"
+        line = (
+            f"{rank};{name.replace(';',',')};{cat_display};"
             f"{format_time(entry.get('original_time',0))};{format_time(entry.get('penalty',0))};"
             f"{format_time(entry.get('time',0), entry.get('disqualified',False))};{status}\n"
         )
-    return csv_output
+        lines.append(line); size += len(line)
+        if size >= EXPORT_CHUNK_BYTES: yield "".join(lines).encode("utf-8"); lines = []; size = 0
+    yield "".join(lines).encode("utf-8")
+
+def iter_leaderboard_jsonl(data_to_export, cfg):
+    lines, size = [], 0
+    for rank, name, cat_display, entry in iter_export_rows(data_to_export, cfg):
+        line = json.dumps({"rank": rank, "name": name, "category": entry.get("category"), "category_name": cat_display,
+                           "original_time": entry.get("original_time", 0), "penalty": entry.get("penalty", 0),
+                           "time": entry.get("time", 0), "disqualified": entry.get("disqualified", False)},
+                          ensure_ascii=False, separators=(",", ":")) + "\n"
+        lines.append(line); size += len(line)
+        if size >= EXPORT_CHUNK_BYTES: yield "".join(lines).encode("utf-8"); lines = []; size = 0
+    yield "".join(lines).encode("utf-8")
+
+class ExportChunkSink:
+    # Write-only, non-seekable file: zipfile then streams each member with a data descriptor instead of seeking back
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data; return len(data)
+
+    def flush(self): pass
+
+    def drain(self):
+        data = bytes(self._buffer); self._buffer.clear(); return data
+
+_XML_INVALID_CHARS = dict.fromkeys(c for c in range(32) if c not in (9, 10, 13)) # Not allowed in XML 1.0 text
+
+def xlsx_inline_cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool): return f"<c><v>{value}</v></c>"
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{xml_escape(str(value).translate(_XML_INVALID_CHARS))}</t></is></c>'
+
+def iter_leaderboard_xlsx(data_to_export, cfg):
+    # Minimal SpreadsheetML workbook (one sheet, inline strings, no styles) written row by row into a streamed zip
+    sink = ExportChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr("[Content_Types].xml", '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>')
+        workbook.writestr("_rels/.rels", '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>')
+        workbook.writestr("xl/workbook.xml", '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Leaderboard" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        workbook.writestr("xl/_rels/workbook.xml.rels", '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+            '</Relationships>')
+        with workbook.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            rows = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?><worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>',
+                    "<row>" + "".join(xlsx_inline_cell(h) for h in ("Rank", "Name", "Category", "Original Time", "Penalty", "Final Time", "Status")) + "</row>"]
+            for rank, name, cat_display, entry in iter_export_rows(data_to_export, cfg):
+                status = "Disqualified" if entry.get("disqualified", False) else "Qualified"
+                rows.append("<row>" + "".join(xlsx_inline_cell(v) for v in (
+                    rank, name, cat_display, format_time(entry.get("original_time", 0)), format_time(entry.get("penalty", 0)),
+                    format_time(entry.get("time", 0), entry.get("disqualified", False)), status)) + "</row>")
+                if len(rows) >= 512:
+                    sheet.write("".join(rows).encode("utf-8")); rows = []
+                    chunk = sink.drain()
+                    if chunk: yield chunk
+            rows.append("</sheetData></worksheet>")
+            sheet.write("".join(rows).encode("utf-8"))
+    yield sink.drain() # Rest of the sheet plus the central directory
+
+# format -> (content type, file extension, chunk generator)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv", iter_leaderboard_csv),
+    "jsonl": ("application/x-ndjson; charset=utf-8", "jsonl", iter_leaderboard_jsonl),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx", iter_leaderboard_xlsx),
+}
+
+# Finished export bytes per (format, category), valid while (board version, config version) is unchanged
+_export_cache = {}
+
+# --- Static Assets (served from /static/<content hash>.<ext>, cached by browsers for good) ---
+static_assets = {} # URL path -> (content type, body bytes)
+
+def register_static_asset(source, extension, content_type):
+    body = source.encode("utf-8")
+    url_path = f"/static/{hashlib.sha256(body).hexdigest()[:16]}.{extension}" # Changes whenever the content does
+    static_assets[url_path] = (content_type, body)
+    return url_path
+
+LEADERBOARD_CSS_URL = register_static_asset("""body{font-family:'Segoe UI',Verdana,sans-serif;background-color:#f8f9fa;color:#343a40;margin:0;padding:20px}.container{width:90%;max-width:950px;margin:20px auto;background-color:#fff;padding:30px;border-radius:10px;box-shadow:0 4px 12px rgba(0,0,0,.1)}h1{text-align:center;color:#0056b3}h1,table{margin-bottom:30px}th,td{border:1px solid #dee2e6;padding:10px 12px;text-align:left}th{background-color:#e9ecef}.header-controls{position:fixed;top:10px;right:20px}.button-link{display:inline-block;padding:10px 20px;margin:5px;color:#fff;text-decoration:none;border-radius:5px;border:none;cursor:pointer;background-color:#007bff}.button-link.admin{background-color:#28a745}.category-button{background-color:#6c757d}.category-button.active{background-color:#007bff;font-weight:700}table{border-collapse:collapse;width:100%;font-size:.95em}tr:nth-child(even){background-color:#f8f9fa}.disqualified td{color:#dc3545;font-style:italic}tr.me td{font-weight:700;background-color:#fff3cd}""", "css", "text/css; charset=utf-8")
+
+LEADERBOARD_JS_URL = register_static_asset("""var lastEtag=null;function viewQuery(){var q=new URLSearchParams(window.location.search),v=new URLSearchParams;v.set("category",q.get("category")||"All Categories");["offset","limit","me"].forEach(function(k){q.get(k)&&v.set(k,q.get(k))});return v.toString()}function refreshLeaderboard(){var x=new XMLHttpRequest;x.onreadystatechange=function(){if(this.readyState!=4)return;if(this.status==200){var e=document.getElementById("leaderboard");e&&(e.innerHTML=this.responseText);lastEtag=this.getResponseHeader("ETag")}else this.status!=304&&console.error("Refresh fail:"+this.status)};x.open("GET","/leaderboard_table?"+viewQuery(),!0);x.setRequestHeader("Cache-Control","no-cache");lastEtag&&x.setRequestHeader("If-None-Match",lastEtag);x.send()}function startLeaderboardStream(){if(!window.EventSource){refreshLeaderboard();setInterval(refreshLeaderboard,10000);return}var u="/events?"+viewQuery();lastEtag&&(u+="&last_event_id="+encodeURIComponent(lastEtag.replace(/"/g,"")));var s=new EventSource(u);s.addEventListener("table",function(v){var e=document.getElementById("leaderboard");e&&(e.innerHTML=v.data);lastEtag='"'+v.lastEventId+'"'});s.addEventListener("delta",function(v){applyDelta(JSON.parse(v.data).rows);lastEtag='"'+v.lastEventId+'"'});s.onerror=function(){console.error("Event stream interrupted, reconnecting...")}}function rowOrder(r){return r.dataset.o.split(",").map(Number)}function orderBefore(a,b){for(var i=0;i<a.length;i++)if(a[i]!=b[i])return a[i]<b[i];return!1}function fmtTime(s,d){s=Math.max(0,+s||0);function p(n){return(n<10?"0":"")+n}var t=p(Math.floor(s/3600))+":"+p(Math.floor(s%3600/60))+":"+p(Math.floor(s%60));return d?"D: "+t:t}
+function applyDelta(rows){var b=document.querySelector("#leaderboard tbody");if(!b)return;b.querySelectorAll("tr:not([data-o])").forEach(function(r){r.remove()});rows.forEach(function(d){var o=d.order,old=b.querySelector('tr[data-s="'+o[3]+'"]');old&&old.remove();var r=document.createElement("tr");r.className=d.disqualified?"disqualified":"";r.dataset.o=o.join(",");r.dataset.s=o[3];["",d.name,d.category_name,fmtTime(d.original_time),fmtTime(d.penalty),fmtTime(d.time,d.disqualified),d.disqualified?"Diskvalifikovaný":"Kvalifikovaný"].forEach(function(v){var c=document.createElement("td");c.textContent=v;r.appendChild(c)});var n=null,all=b.querySelectorAll("tr[data-o]");for(var i=0;i<all.length;i++)if(orderBefore(o,rowOrder(all[i]))){n=all[i];break}b.insertBefore(r,n)});b.querySelectorAll("tr[data-o]").forEach(function(r,i){r.cells[0].textContent=i+1})}
+document.addEventListener("DOMContentLoaded",function(){var e=document.getElementById("leaderboard");lastEtag=e&&e.dataset.etag||null;startLeaderboardStream()});""", "js", "text/javascript; charset=utf-8")
+
+ADMIN_CSS_URL = register_static_asset("""body{font-family:'Segoe UI',Verdana,sans-serif;background-color:#f8f9fa;color:#343a40;margin:0;padding:20px}.container{width:90%;max-width:1200px;margin:20px auto;background-color:#fff;padding:30px;border-radius:10px;box-shadow:0 4px 12px rgba(0,0,0,.1)}h1,h2,h3,h4{text-align:center;color:#0056b3;margin-bottom:15px;font-weight:600}h2{margin-top:30px;border-bottom:1px solid #dee2e6;padding-bottom:8px}h3{color:#17a2b8;margin-top:25px}h4{color:#28a745;font-size:1.1em;margin-top:15px;text-align:left;padding-left:5px}label{display:block;margin-top:10px;font-weight:600;margin-bottom:3px}input[type=text],input[type=number],select,input[type=password]{width:100%;padding:8px;margin-top:3px;margin-bottom:10px;border:1px solid #ced4da;border-radius:4px;box-sizing:border-box;font-size:.95em}.button-base{display:inline-block;padding:10px 20px;margin:8px 4px;color:#fff;text-decoration:none;border-radius:5px;border:none;cursor:pointer;font-size:.95em}.button-save{background-color:#28a745}.button-back{background-color:#6c757d}.button-export{background-color:#ffc107;color:#343a40}.button-reset{background-color:#dc3545}.button-add-section,.button-remove-section{background-color:#007bff;font-size:.85em;padding:5px 10px;margin-left:10px}.button-remove-section{background-color:#dc3545}.button-container{text-align:center;margin-top:25px;padding-top:15px;border-top:1px solid #eee}.config-section,.display-names-section,.per-category-q-count-section,.category-sections-definition-area{display:flex;flex-wrap:wrap;justify-content:space-around;gap:15px;margin-bottom:20px;padding:15px;border-radius:8px}.config-section{background-color:#f0f8ff;border:1px solid #b0e0e6}.display-names-section{background-color:#e6f7ff;border:1px solid #91d5ff}.per-category-q-count-section{background-color:#fffbe6;border:1px solid #ffe58f}.category-sections-definition-area{background-color:#f0fff0;border:1px solid #a2d2a2;margin-top:10px;flex-direction:column}.config-item,.form-group{flex:1;min-width:200px}.section-entry{display:flex;gap:10px;align-items:center;margin-bottom:8px;padding:8px;border:1px dashed #ccc;border-radius:4px;background-color:#fafafa}.section-entry label{margin-top:0;white-space:nowrap}.section-entry input[type=text]{flex-grow:1}.section-entry input[type=number]{width:80px;flex-shrink:0}.category-container{display:flex;justify-content:space-around;flex-wrap:wrap;gap:20px;margin-top:15px}.category-section{flex:1;min-width:300px;max-width:32%;border:1px solid #dee2e6;padding:15px;border-radius:8px;background-color:#f8f9fa}.category-answers-box{margin-top:8px}.answer-group{margin-bottom:5px;padding-left:15px}.validation-error{color:red;font-size:.9em;text-align:center;margin:5px 0 10px;min-height:1em}.section-sum-info{font-size:.9em;color:#007bff;margin-top:5px;text-align:right;padding-right:10px;min-height:1em}.category-config-item{border:1px solid #ddd;padding:15px;margin-bottom:20px;border-radius:5px}.reset-section{margin-top:30px;padding-top:20px;border-top:1px solid #eee}""", "css", "text/css; charset=utf-8")
 
-def generate_leaderboard_html(leaderboard, selected_category="All Categories"):
-    global CATEGORY_DISPLAY_NAMES
+# Sections editor (adding/removing sections, validating sums) and the reset button; the server checks the reset password
+ADMIN_JS_URL = register_static_asset("""let sectionCounters = {};
+function initializeSectionCounters() { const cK = JSON_CATEGORY_KEYS;cK.forEach(k=>{const co=document.getElementById('sections_container_'+k);sectionCounters[k]=co?co.getElementsByClassName('section-entry').length:0;});}
+function addSectionEntry(cK,maxQTotal){const co=document.getElementById('sections_container_'+cK);if(!co)return;const sIdx=sectionCounters[cK]++;const eD=document.createElement('div');eD.className='section-entry';eD.id=`section_entry_${cK}_${sIdx}`;eD.innerHTML=`<label for="section_name_${cK}_${sIdx}">Názov:</label><input type="text" name="section_name_${cK}[]" id="section_name_${cK}_${sIdx}" placeholder="Názov sekcie" required><label for="section_q_count_${cK}_${sIdx}">Otázok:</label><input type="number" name="section_q_count_${cK}[]" id="section_q_count_${cK}_${sIdx}" value="1" min="1" max="${maxQTotal}" required oninput="updateCategorySectionSum('${cK}')"><button type="button" class="button-base button-remove-section" onclick="removeSectionEntry('section_entry_${cK}_${sIdx}','${cK}')">Odstrániť</button>`;co.appendChild(eD);updateCategorySectionSum(cK);}
+function removeSectionEntry(eId,cK){const e=document.getElementById(eId);if(e)e.remove();updateCategorySectionSum(cK);}
+function updateCategorySectionSum(cK){const co=document.getElementById('sections_container_'+cK);const tQI=document.getElementById('num_questions_'+cK);const sID=document.getElementById('section_sum_info_'+cK);const eDv=document.getElementById('sections_validation_error_'+cK);if(!co||!tQI||!sID||!eDv)return;const tA=parseInt(tQI.value)||0;let cSS=0;const sQIs=co.querySelectorAll('input[name^="section_q_count_'+cK+'"]');sQIs.forEach(i=>{cSS+=parseInt(i.value)||0;});sID.textContent=`Súčet v sekciách: ${cSS} / ${tA}`;if(cSS!==tA&&sQIs.length>0){eDv.textContent='POZOR: Súčet v sekciách sa nerovná celkovému počtu otázok!';sID.style.color='red';tQI.style.borderColor='red';}else{eDv.textContent='';sID.style.color=cSS===tA&&sQIs.length>0?'green':'#007bff';tQI.style.borderColor='';}}
+document.addEventListener('DOMContentLoaded',()=>{initializeSectionCounters();const cK=JSON_CATEGORY_KEYS;cK.forEach(k=>{updateCategorySectionSum(k);const tCI=document.getElementById('num_questions_'+k);if(tCI)tCI.addEventListener('input',()=>updateCategorySectionSum(k));});});
+function checkPasswordAndReset(){var p=document.getElementById('resetPassword').value;if(!p){alert('Zadajte heslo.');return}if(confirm('Naozaj VYMAZAŤ VŠETKY VÝSLEDKY?')){if(confirm('Posledné varovanie! Naozaj?')){var x=new XMLHttpRequest;x.open('POST','/admin_reset',!0);x.setRequestHeader('Content-type','application/x-www-form-urlencoded');x.onload=function(){200<=this.status&&300>this.status?(alert('Tabuľka resetovaná!'),window.location.reload()):403==this.status?alert('Nesprávne heslo.'):alert('Chyba resetu: '+this.status)};x.send('password='+encodeURIComponent(p))}}}""".replace("JSON_CATEGORY_KEYS", json.dumps(CATEGORY_NAMES_CONFIG_KEYS)), "js", "text/javascript; charset=utf-8")
+
+def generate_leaderboard_html(table_etag, table_html, cfg, selected_category="All Categories"):
     cat_buttons_html = '<div style="text-align:center;margin-bottom:20px;">'
-    for cat_key, cat_disp_name in CATEGORY_DISPLAY_NAMES.items():
+    for cat_key, cat_disp_name in cfg.category_display_names.items():
         active_class = 'active' if cat_key == selected_category else ''
         cat_buttons_html += f'<form action="/" method="GET" style="display:inline;"><input type="hidden" name="category" value="{cat_key}"><button type="submit" class="button-link category-button {active_class}">{cat_disp_name}</button></form>'
     cat_buttons_html += "</div>"
 
-    style = """<style>body{font-family:'Segoe UI',Verdana,sans-serif;background-color:#f8f9fa;color:#343a40;margin:0;padding:20px}.container{width:90%;max-width:950px;margin:20px auto;background-color:#fff;padding:30px;border-radius:10px;box-shadow:0 4px 12px rgba(0,0,0,.1)}h1{text-align:center;color:#0056b3}h1,table{margin-bottom:30px}th,td{border:1px solid #dee2e6;padding:10px 12px;text-align:left}th{background-color:#e9ecef}.header-controls{position:fixed;top:10px;right:20px}.button-link{display:inline-block;padding:10px 20px;margin:5px;color:#fff;text-decoration:none;border-radius:5px;border:none;cursor:pointer;background-color:#007bff}.button-link.admin{background-color:#28a745}.category-button{background-color:#6c757d}.category-button.active{background-color:#007bff;font-weight:700}table{border-collapse:collapse;width:100%;font-size:.95em}tr:nth-child(even){background-color:#f8f9fa}.disqualified td{color:#dc3545;font-style:italic}</style>"""
-    script = """<script>function refreshLeaderboard(){var x=new XMLHttpRequest;x.onreadystatechange=function(){if(this.readyState==4&&this.status==200){var e=document.getElementById("leaderboard");e&&(e.innerHTML=this.responseText)}else this.readyState==4&&console.error("Refresh fail:"+this.status)};const e=(new URLSearchParams(window.location.search)).get("category")||"All Categories";x.open("GET","/leaderboard_table?category="+encodeURIComponent(e),!0);x.setRequestHeader("Cache-Control","no-cache");x.send()}document.addEventListener("DOMContentLoaded",function(){refreshLeaderboard();setInterval(refreshLeaderboard,10000)});</script>"""
-    initial_table = generate_leaderboard_table_html(leaderboard)
-    selected_cat_display = CATEGORY_DISPLAY_NAMES.get(selected_category, selected_category)
-    return f'<!DOCTYPE html><html lang="sk"><head><meta charset="UTF-8"><title>Tabuľka - {selected_cat_display}</title>{style}{script}</head><body><div class="header-controls"><a href="/admin" class="button-link admin">Admin</a></div><div class="container"><h1>Tabuľka Výsledkov</h1>{cat_buttons_html}<div id="leaderboard">{initial_table}</div></div></body></html>'
-
-def generate_leaderboard_table_html(leaderboard_to_display):
-    global CATEGORY_DISPLAY_NAMES
-    table_content = "<table><thead><tr><th>Poradie</th><th>Meno</th><th>Kategória</th><th>Pôvodný Čas</th><th>Penalizácia</th><th>Výsledný čas</th><th>Status</th></tr></thead><tbody>"
-    if not leaderboard_to_display:
+    selected_cat_display = cfg.category_display_names.get(selected_category, selected_category)
+    etag_attr = table_etag.replace('"', "&quot;")
+    return f'<!DOCTYPE html><html lang="sk"><head><meta charset="UTF-8"><title>Tabuľka - {selected_cat_display}</title><link rel="stylesheet" href="{LEADERBOARD_CSS_URL}"><script src="{LEADERBOARD_JS_URL}" defer></script></head><body><div class="header-controls"><a href="/admin" class="button-link admin">Admin</a></div><div class="container"><h1>Tabuľka Výsledkov</h1>{cat_buttons_html}<div id="leaderboard" data-etag="{etag_attr}">{table_html}</div></div></body></html>'
+
+# --- Compiled Page Shells ---
+# The leaderboard and admin pages are generated once per config version with PAGE_SLOT markers where per-request
+# content goes, split into encoded segments and then filled with a single join per request.
+PAGE_SLOT = "\x00slot\x00"
+_page_shell_cache = {} # (page, variant) -> (config version, segments)
+
+def get_page_shell(page_key, cfg, build_html):
+    cached = _page_shell_cache.get(page_key)
+    if cached is not None and cached[0] == cfg.version: return cached[1]
+    segments = tuple(part.encode("utf-8") for part in build_html().split(PAGE_SLOT))
+    _page_shell_cache[page_key] = (cfg.version, segments)
+    return segments
+
+def render_leaderboard_page(table_etag, table_body, cfg, selected_category):
+    segments = get_page_shell(("leaderboard", selected_category), cfg,
+                              lambda: generate_leaderboard_html(PAGE_SLOT, PAGE_SLOT, cfg, selected_category))
+    return b"".join((segments[0], table_etag.replace('"', "&quot;").encode("utf-8"), segments[1], table_body, segments[2]))
+
+def describe_freeze_status():
+    frozen = frozen_board
+    if frozen is None: return "Tabuľka sa aktualizuje priebežne."
+    return f"Tabuľka je zmrazená od {time.strftime('%H:%M:%S', time.localtime(frozen[1]))}; výsledky sa naďalej ukladajú."
+
+def render_admin_page(cfg, freeze_status):
+    segments = get_page_shell(("admin", None), cfg, lambda: generate_admin_html(cfg, PAGE_SLOT))
+    return b"".join((segments[0], freeze_status.encode("utf-8"), segments[1]))
+
+@timed(table_render_seconds)
+def generate_leaderboard_table_html(ranked_pairs, cfg, frozen_at=None, highlight_seqs=(), pager_html=""):
+    # ranked_pairs: (rank, (sort_key, entry)) in rank order, may be a lazy iterator over a board snapshot.
+    # Rows carry their sort key (data-o) and seq (data-s) so the page script can patch the table from deltas;
+    # a jump in rank (a page plus the participant's own row) gets a "…" row.
+    table_content = ""
+    if frozen_at is not None:
+        table_content += f'<p style="text-align:center;font-weight:700;color:#856404;background-color:#fff3cd;padding:8px;border-radius:5px;">Tabuľka je zmrazená (stav o {time.strftime("%H:%M:%S", time.localtime(frozen_at))}).</p>'
+    table_content += "<table><thead><tr><th>Poradie</th><th>Meno</th><th>Kategória</th><th>Pôvodný Čas</th><th>Penalizácia</th><th>Výsledný čas</th><th>Status</th></tr></thead><tbody>"
+    prev_rank = None
+    for rank, (sort_key, entry) in ranked_pairs:
+        if prev_rank is not None and rank != prev_rank + 1:
+            table_content += '<tr class="gap"><td colspan="7" style="text-align:center;">…</td></tr>'
+        prev_rank = rank
+        cat_key = entry.get("category", "N/A")
+        cat_disp = cfg.category_display_names.get(cat_key, cat_key)
+        status = "Diskvalifikovaný" if entry.get("disqualified", False) else "Kvalifikovaný"
+        row_cls = 'disqualified' if entry.get("disqualified", False) else ''
+        if sort_key[3] in highlight_seqs: row_cls += ' me'
+        table_content += (
+            f'<tr class="{row_cls}" data-o="{int(sort_key[0])},{sort_key[1]},{sort_key[2]},{sort_key[3]}" data-s="{sort_key[3]}"><td>{rank}</td><td>{entry.get("name","N/A")}</td><td>{cat_disp}</td>'
+            f'<td>{format_time(entry.get("original_time",0))}</td><td>{format_time(entry.get("penalty",0))}</td>'
+            f'<td>{format_time(entry.get("time",0), entry.get("disqualified",False))}</td><td>{status}</td></tr>'
+        )
+    if prev_rank is None:
         table_content += '<tr><td colspan="7" style="text-align:center;padding:20px;">Žiadne výsledky v tejto kategórii.</td></tr>'
-    else:
-        for i, entry in enumerate(leaderboard_to_display):
-            cat_key = entry.get("category", "N/A")
-            cat_disp = CATEGORY_DISPLAY_NAMES.get(cat_key, cat_key)
-            status = "Diskvalifikovaný" if entry.get("disqualified", False) else "Kvalifikovaný"
-            row_cls = 'disqualified' if entry.get("disqualified", False) else ''
-            table_content += (
-                f'<tr class="{row_cls}"><td>{i+1}</td><td>{entry.get("name","N/A")}</td><td>{cat_disp}</td>'
-                f'<td>{format_time(entry.get("original_time",0))}</td><td>{format_time(entry.get("penalty",0))}</td>'
-                f'<td>{format_time(entry.get("time",0), entry.get("disqualified",False))}</td><td>{status}</td></tr>'
-            )
-    table_content += "</tbody></table>"
+    table_content += "</tbody></table>" + pager_html
     return table_content
 
+def parse_leaderboard_window(query_data):
+    # (offset, limit, me) from ?offset=&limit=&me=, or None for the whole board; ValueError on bad numbers.
+    # limit=N alone is a top-N view; me=<name> adds that participant's row(s) with their real rank.
+    offset = int(query_data.get("offset", ["0"])[0] or 0)
+    limit_param = query_data.get("limit", [""])[0]
+    limit = int(limit_param) if limit_param else None
+    me = query_data.get("me", [""])[0].strip()
+    if offset < 0 or (limit is not None and limit < 0): raise ValueError("offset and limit must not be negative")
+    if offset == 0 and limit is None and not me: return None
+    return offset, limit, me
+
+def leaderboard_window_rows(board, category_key, window):
+    # [(rank, pair)] for one page of the snapshot, built from the sorted order without touching the rest,
+    # then the requesting participant's rows that fall outside the page (ranked by bisection)
+    offset, limit, me = window
+    page_end = None if limit is None else offset + limit
+    ranked_pairs = list(enumerate(itertools.islice(board.iter_pairs(category_key, offset), limit), offset + 1))
+    if me:
+        for pair in board.find(me, category_key):
+            rank = board.rank(pair[0], category_key) + 1
+            if rank <= offset or (page_end is not None and rank > page_end): ranked_pairs.append((rank, pair))
+        ranked_pairs.sort(key=lambda ranked: ranked[0])
+    return ranked_pairs
+
+def generate_leaderboard_pager_html(category_key, window, total):
+    offset, limit, me = window
+    if limit is None or not limit: return ""
+    def page_link(page_offset, label):
+        query = urllib.parse.urlencode([("category", category_key), ("offset", page_offset), ("limit", limit)] + ([("me", me)] if me else []))
+        return f'<a class="button-link category-button" href="/?{query}">{label}</a>'
+    links = page_link(max(offset - limit, 0), "&laquo; Predošlé") if offset > 0 else ""
+    links += f' Zobrazené {min(offset + 1, total)}–{min(offset + limit, total)} z {total} '
+    if offset + limit < total: links += page_link(offset + limit, "Ďalšie &raquo;")
+    return f'<p style="text-align:center;">{links}</p>'
+
+# Rendered + encoded public table, valid while (board version, config version, frozen) is unchanged. Full tables
+# (one per category, so bounded) are never evicted: they are the expensive ones and what the big screens poll.
+# Windows (one per page and me= participant) go in a separate LRU, so many phones can't push the full tables out.
+_table_render_cache = {} # category -> (version_key, etag, body)
+_window_render_cache = {} # (category, offset, limit, me) -> (version_key, etag, body), least recently used first
+_table_render_cache_lock = threading.Lock()
+
+def get_leaderboard_table_render(category_key, cfg, window=None):
+    # Returns (etag, body_bytes); an idle poll costs one dict lookup. A window (parse_leaderboard_window) renders
+    # only that page: cost follows the page size, not the board size.
+    frozen = frozen_board
+    board = frozen[0] if frozen is not None else leaderboard_store.snapshot() # Immutable: renders exactly one version
+    version_key = (board.version, cfg.version, frozen is not None)
+    render_cache = _table_render_cache if window is None else _window_render_cache
+    cache_key = category_key if window is None else (category_key,) + window
+    cached = render_cache.get(cache_key)
+    if cached is not None and cached[0] == version_key:
+        if window is not None:
+            with _table_render_cache_lock: # Mark as most recently used
+                if render_cache.get(cache_key) is cached: render_cache[cache_key] = render_cache.pop(cache_key)
+        return cached[1], cached[2]
+    frozen_at = frozen[1] if frozen is not None else None
+    if window is None:
+        body = generate_leaderboard_table_html(enumerate(board.iter_pairs(category_key), 1), cfg, frozen_at).encode("utf-8")
+    else:
+        highlight_seqs = {pair[0][3] for pair in board.find(window[2], category_key)} if window[2] else ()
+        body = generate_leaderboard_table_html(leaderboard_window_rows(board, category_key, window), cfg, frozen_at, highlight_seqs,
+                                               generate_leaderboard_pager_html(category_key, window, board.count(category_key))).encode("utf-8")
+    etag = f'"{table_event_id(*version_key, category_key, window)}"'
+    with _table_render_cache_lock:
+        render_cache.pop(cache_key, None) # Re-inserted as most recently used
+        if window is not None:
+            while len(render_cache) >= TABLE_RENDER_CACHE_MAX_ENTRIES: render_cache.pop(next(iter(render_cache)))
+        render_cache[cache_key] = (version_key, etag, body)
+    return etag, body
+
+# --- Response Compression ---
+_COMPRESSION_WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS} # "deflate" in HTTP is zlib-wrapped
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson") # XLSX is a zip already
+_compressed_cache = {}
+_compressed_cache_lock = threading.Lock()
+
+def choose_content_encoding(accept_encoding_header):
+    # "gzip" or "deflate" if the client accepts it (q > 0), gzip preferred; None for identity
+    accepted = {}
+    for part in (accept_encoding_header or "").split(","):
+        coding, _, params = part.partition(";")
+        q_value = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try: q_value = float(params[2:])
+            except ValueError: q_value = 0.0
+        accepted[coding.strip().lower()] = q_value
+    for coding in ("gzip", "deflate"):
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0: return coding
+    return None
+
+def make_compressor(encoding):
+    return zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, _COMPRESSION_WBITS[encoding])
+
+def compress_body(body, encoding, cache_key=None):
+    # cache_key names the content version (e.g. the table ETag); each version is compressed once per encoding
+    if cache_key is not None:
+        cached = _compressed_cache.get((cache_key, encoding))
+        if cached is not None: return cached
+    compressor = make_compressor(encoding)
+    compressed = compressor.compress(body) + compressor.flush()
+    if cache_key is not None:
+        with _compressed_cache_lock:
+            while len(_compressed_cache) >= COMPRESSION_CACHE_MAX_ENTRIES: _compressed_cache.pop(next(iter(_compressed_cache)))
+            _compressed_cache[(cache_key, encoding)] = compressed
+    return compressed
+
+def etag_for_encoding(etag, encoding):
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"' # Each representation gets its own strong ETag
+
+def table_event_id(board_version, config_version, frozen, category_key, window=None):
+    # Table ETag (without quotes) and SSE event id: names the board, config and freeze state a client has seen
+    event_id = f'{board_version}.{config_version}{".f" if frozen else ""}.{urllib.parse.quote(category_key)}'
+    if window is not None: event_id += f'.{window[0]}-{"" if window[1] is None else window[1]}-{urllib.parse.quote(window[2], safe="")}'
+    return event_id
+
+def parse_table_event_id(event_id):
+    # (board version, config version, frozen) from table_event_id() output, or None
+    try:
+        parts = (event_id or "").split(".")
+        return int(parts[0]), int(parts[1]), len(parts) > 3 and parts[2] == "f"
+    except (ValueError, IndexError): return None
+
+def leaderboard_row_json(pair, cfg, rank=None):
+    sort_key, entry = pair
+    cat_key = entry.get("category", "N/A")
+    row = {"name": entry.get("name", "N/A"), "category": cat_key, "category_name": cfg.category_display_names.get(cat_key, cat_key),
+           "original_time": entry.get("original_time", 0), "penalty": entry.get("penalty", 0), "time": entry.get("time", 0),
+           "disqualified": entry.get("disqualified", False), "order": [int(sort_key[0]), sort_key[1], sort_key[2], sort_key[3]]}
+    if rank is not None: row["rank"] = rank
+    return row
+
+def build_leaderboard_payload(category_key, since_version, config_version_seen, cfg, window=None):
+    # /api/leaderboard: only the rows put since since_version when the changelog covers it and the client
+    # rendered with the same config, otherwise the full (public) board in rank order; a window always gets
+    # its page (plus the participant's rows) in full
+    frozen = frozen_board
+    board = frozen[0] if frozen is not None else leaderboard_store.snapshot()
+    changed = None
+    if window is None and since_version is not None and config_version_seen == cfg.version:
+        changed = board.changes_since(since_version, category_key)
+    if window is not None: ranked_pairs = leaderboard_window_rows(board, category_key, window)
+    elif changed is not None: ranked_pairs = [(board.rank(pair[0], category_key) + 1, pair) for pair in changed]
+    else: ranked_pairs = enumerate(board.iter_pairs(category_key), 1)
+    payload = {"version": board.version, "config_version": cfg.version, "category": category_key,
+               "frozen_at": frozen[1] if frozen is not None else None, "full": changed is None, "total": board.count(category_key),
+               "rows": [leaderboard_row_json(pair, cfg, rank) for rank, pair in ranked_pairs]}
+    if window is not None: payload["offset"], payload["limit"] = window[0], window[1]
+    return payload
+
+def build_rank_payload(name, category_key, cfg):
+    # /api/rank: the participant's place on the public board in O(log n) per category list - rank by bisection in
+    # the snapshot's chunked order, the entry above by positional access. "All Categories" ranks each of their
+    # results against everyone. Returns (payload, found).
+    frozen = frozen_board
+    board = frozen[0] if frozen is not None else leaderboard_store.snapshot()
+    results = []
+    for pair in board.find(name, category_key):
+        sort_key, entry = pair
+        above = board.pair_before(sort_key, category_key)
+        row = leaderboard_row_json(pair, cfg, board.rank(sort_key, category_key) + 1)
+        row["total"] = board.count(category_key)
+        row["above"] = None if above is None else {"name": above[1].get("name", "N/A"), "category": above[1].get("category"),
+                                                   "time": above[1].get("time", 0), "disqualified": above[1].get("disqualified", False)}
+        row["gap_to_above"] = None if above is None else round(entry.get("time", 0) - above[1].get("time", 0), 3)
+        results.append(row)
+    return {"name": name.strip(), "category": category_key, "version": board.version,
+            "frozen_at": frozen[1] if frozen is not None else None, "results": results}, bool(results)
+
+def build_search_payload(query, category_key, limit, cfg):
+    # /api/search: index hits in name order, each resolved to its pair in the public snapshot and ranked by
+    # bisection (rank is within category_key, as in /api/rank); nothing walks the board
+    frozen = frozen_board
+    board = frozen[0] if frozen is not None else leaderboard_store.snapshot()
+    match_count, matches = board.search_index.search(query, category_key, limit)
+    results = []
+    for name, cat_key in matches:
+        for pair in board.find(name, cat_key): # Empty for participants who arrived after a freeze
+            results.append(leaderboard_row_json(pair, cfg, board.rank(pair[0], category_key) + 1))
+    return {"query": query, "category": category_key, "version": board.version, "matches": match_count, "results": results}
+
+def etag_matches(if_none_match_header, etag):
+    if not if_none_match_header: return False
+    candidates = [t.strip() for t in if_none_match_header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
 # --- Admin Page HTML Generation (MODIFIED for single form) ---
-def generate_admin_html(config):
-    global GENERAL_MAX_QUESTIONS, PENALTY_PER_INCORRECT, CATEGORY_DISPLAY_NAMES, NUM_QUESTIONS_PER_CATEGORY, CATEGORY_SECTIONS, ADMIN_PASSWORD
-
-    penalty_val = PENALTY_PER_INCORRECT
-    current_gen_max_q = GENERAL_MAX_QUESTIONS
-    current_disp_names = CATEGORY_DISPLAY_NAMES
-    current_num_q_cat = NUM_QUESTIONS_PER_CATEGORY
-    current_cat_sections = CATEGORY_SECTIONS
+def generate_admin_html(cfg, freeze_status):
+    penalty_val = cfg.penalty
+    current_gen_max_q = cfg.general_max_questions
+    current_disp_names = cfg.category_display_names
+    current_num_q_cat = cfg.num_questions_per_category
+    current_cat_sections = cfg.category_sections
     cat_conf_keys = CATEGORY_NAMES_CONFIG_KEYS
 
-    admin_style = """<style>body{font-family:'Segoe UI',Verdana,sans-serif;background-color:#f8f9fa;color:#343a40;margin:0;padding:20px}.container{width:90%;max-width:1200px;margin:20px auto;background-color:#fff;padding:30px;border-radius:10px;box-shadow:0 4px 12px rgba(0,0,0,.1)}h1,h2,h3,h4{text-align:center;color:#0056b3;margin-bottom:15px;font-weight:600}h2{margin-top:30px;border-bottom:1px solid #dee2e6;padding-bottom:8px}h3{color:#17a2b8;margin-top:25px}h4{color:#28a745;font-size:1.1em;margin-top:15px;text-align:left;padding-left:5px}label{display:block;margin-top:10px;font-weight:600;margin-bottom:3px}input[type=text],input[type=number],select,input[type=password]{width:100%;padding:8px;margin-top:3px;margin-bottom:10px;border:1px solid #ced4da;border-radius:4px;box-sizing:border-box;font-size:.95em}.button-base{display:inline-block;padding:10px 20px;margin:8px 4px;color:#fff;text-decoration:none;border-radius:5px;border:none;cursor:pointer;font-size:.95em}.button-save{background-color:#28a745}.button-back{background-color:#6c757d}.button-export{background-color:#ffc107;color:#343a40}.button-reset{background-color:#dc3545}.button-add-section,.button-remove-section{background-color:#007bff;font-size:.85em;padding:5px 10px;margin-left:10px}.button-remove-section{background-color:#dc3545}.button-container{text-align:center;margin-top:25px;padding-top:15px;border-top:1px solid #eee}.config-section,.display-names-section,.per-category-q-count-section,.category-sections-definition-area{display:flex;flex-wrap:wrap;justify-content:space-around;gap:15px;margin-bottom:20px;padding:15px;border-radius:8px}.config-section{background-color:#f0f8ff;border:1px solid #b0e0e6}.display-names-section{background-color:#e6f7ff;border:1px solid #91d5ff}.per-category-q-count-section{background-color:#fffbe6;border:1px solid #ffe58f}.category-sections-definition-area{background-color:#f0fff0;border:1px solid #a2d2a2;margin-top:10px;flex-direction:column}.config-item,.form-group{flex:1;min-width:200px}.section-entry{display:flex;gap:10px;align-items:center;margin-bottom:8px;padding:8px;border:1px dashed #ccc;border-radius:4px;background-color:#fafafa}.section-entry label{margin-top:0;white-space:nowrap}.section-entry input[type=text]{flex-grow:1}.section-entry input[type=number]{width:80px;flex-shrink:0}.category-container{display:flex;justify-content:space-around;flex-wrap:wrap;gap:20px;margin-top:15px}.category-section{flex:1;min-width:300px;max-width:32%;border:1px solid #dee2e6;padding:15px;border-radius:8px;background-color:#f8f9fa}.category-answers-box{margin-top:8px}.answer-group{margin-bottom:5px;padding-left:15px}.validation-error{color:red;font-size:.9em;text-align:center;margin:5px 0 10px;min-height:1em}.section-sum-info{font-size:.9em;color:#007bff;margin-top:5px;text-align:right;padding-right:10px;min-height:1em}.category-config-item{border:1px solid #ddd;padding:15px;margin-bottom:20px;border-radius:5px}.reset-section{margin-top:30px;padding-top:20px;border-top:1px solid #eee}</style>"""
-
-    # The JavaScript for sections is now part of SimpleRequestHandler.get_admin_sections_script()
-    # It will be injected into the <head> by the calling do_GET method.
-
-    page_html = f"""<!DOCTYPE html><html lang="sk"><head><meta charset="UTF-8"><title>Admin Nastavenia</title>{admin_style}
-    {SimpleRequestHandler.get_admin_sections_script(None)}
+    page_html = f"""<!DOCTYPE html><html lang="sk"><head><meta charset="UTF-8"><title>Admin Nastavenia</title><link rel="stylesheet" href="{ADMIN_CSS_URL}"><script src="{ADMIN_JS_URL}" defer></script>
     </head><body><div class="container"><h1>Admin - Nastavenia Súťaže</h1>
     
     <form action="/save_answers" method="post"> 
@@ -256,7 +1596,7 @@ def generate_admin_html(config):
             <h4>Sekcie pre '{cat_disp_name_loop}' <button type="button" class="button-base button-add-section" onclick="addSectionEntry('{cat_key_loop}', document.getElementById('num_questions_{cat_key_loop}').value)">Pridať Sekciu</button></h4>
             <div id="sections_container_{cat_key_loop}" class="category-sections-definition-area">"""
         for i, sec in enumerate(sections_for_cat_loop):
-            sec_name, sec_q = sec.get('name',''), sec.get('num_questions',1)
+            sec_name, sec_q = sec
             page_html += f"""<div class="section-entry" id="section_entry_{cat_key_loop}_{i}">
                 <label for="section_name_{cat_key_loop}_{i}">Názov:</label><input type="text" name="section_name_{cat_key_loop}[]" id="section_name_{cat_key_loop}_{i}" value="{sec_name}" placeholder="Názov sekcie" required>
                 <label for="section_q_count_{cat_key_loop}_{i}">Otázok:</label><input type="number" name="section_q_count_{cat_key_loop}[]" id="section_q_count_{cat_key_loop}_{i}" value="{sec_q}" min="1" max="{total_q_for_cat_loop}" required oninput="updateCategorySectionSum('{cat_key_loop}')">
@@ -273,7 +1613,7 @@ def generate_admin_html(config):
         <div class="category-container">"""
     for cat_key_ans in cat_conf_keys:
         cat_hdr_name = current_disp_names.get(cat_key_ans, cat_key_ans)
-        cat_ans_config = config.get("categories", {}).get(cat_key_ans, {})
+        cat_ans_config = cfg.answer_keys.get(cat_key_ans, {})
         cat_sections_ans = current_cat_sections.get(cat_key_ans, [])
         num_total_q_cat_ans = current_num_q_cat.get(cat_key_ans, 0)
         page_html += f'<div class="category-section"><h3>{cat_hdr_name}</h3><div class="category-answers-box">'
@@ -287,7 +1627,7 @@ def generate_admin_html(config):
                 page_html += f'<div class="answer-group"><label for="{ans_key}">Otázka {q_idx} (celk. {overall_q_count_cat}):</label><select id="{ans_key}" name="{ans_key}"><option value="" {"s" if curr_ans=="" else ""}>--</option><option value="A" {"s" if curr_ans=="A" else ""}>A</option><option value="B" {"s" if curr_ans=="B" else ""}>B</option><option value="C" {"s" if curr_ans=="C" else ""}>C</option><option value="D" {"s" if curr_ans=="D" else ""}>D</option></select></div>'.replace('"s"','"selected"')
         else: # Sections are defined
             for sec_ans in cat_sections_ans:
-                sec_name_ans, num_q_sec_ans = sec_ans.get("name","Bez názvu"), sec_ans.get("num_questions",0)
+                sec_name_ans, num_q_sec_ans = sec_ans
                 page_html += f'<h4>Sekcia: {sec_name_ans} ({num_q_sec_ans} otázok)</h4>'
                 for q_idx_sec in range(1, num_q_sec_ans + 1):
                     overall_q_count_cat += 1
@@ -305,6 +1645,7 @@ def generate_admin_html(config):
     page_html += f'<a href="/leaderboard_excel" class="button-base button-export" download="leaderboard_all.csv">Všetky Kategórie</a>'
     for key_exp in cat_conf_keys:
         page_html += f'<a href="/leaderboard_excel_category?category={key_exp}" class="button-base button-export" download="leaderboard_{current_disp_names.get(key_exp,key_exp).replace(" ","_")}.csv">Export {current_disp_names.get(key_exp,key_exp)}</a>'
+    page_html += '<p style="text-align:center;">Iné formáty (všetky kategórie): <a href="/leaderboard_excel?format=xlsx">XLSX</a> | <a href="/leaderboard_excel?format=jsonl">JSONL</a></p>'
     page_html += "</div>"
     
     page_html += f"""
@@ -315,8 +1656,20 @@ def generate_admin_html(config):
         <div class="button-container" style="border:none;padding-top:0;">
             <button type="button" onclick="checkPasswordAndReset()" class="button-base button-reset">Resetovať Tabuľku</button>
         </div>
-    </div>
-    <script>function checkPasswordAndReset(){{var p=document.getElementById('resetPassword').value;if(!p){{alert('Zadajte heslo.');return}}if(p==='{ADMIN_PASSWORD}'){{if(confirm('Naozaj VYMAZAŤ VŠETKY VÝSLEDKY?')){{if(confirm('Posledné varovanie! Naozaj?')){{var x=new XMLHttpRequest;x.open('POST','/admin_reset',!0);x.setRequestHeader('Content-type','application/x-www-form-urlencoded');x.onload=function(){{200<=this.status&&300>this.status?(alert('Tabuľka resetovaná!'),window.location.reload()):alert('Chyba resetu: '+this.status)}};x.send('password='+encodeURIComponent(p))}}}}}}else alert('Nesprávne heslo.')}}</script>"""
+    </div>"""
+
+    page_html += f"""
+    <div class="reset-section"><h2>Zmrazenie tabuľky</h2><p>{freeze_status}</p>
+        <form action="/admin_freeze" method="post">
+            <div class="form-group" style="max-width:300px;margin:auto;">
+                <label for="freezePassword">Admin Heslo:</label><input type="password" id="freezePassword" name="password" required>
+            </div>
+            <div class="button-container" style="border:none;padding-top:0;">
+                <button type="submit" name="action" value="freeze" class="button-base button-export">Zmraziť teraz</button>
+                <button type="submit" name="action" value="unfreeze" class="button-base button-save">Zrušiť zmrazenie</button>
+            </div>
+        </form>
+    </div>"""
 
     page_html += f"""
     <div class="reset-section"><h2>Manuálne Pridanie Záznamu</h2>
@@ -332,6 +1685,25 @@ def generate_admin_html(config):
             <div class="button-container" style="border:none;padding-top:10px;"><button type="submit" class="button-base button-save">Pridať Záznam</button></div>
         </form>
     </div>
+    <div class="reset-section"><h2>Profilovanie servera</h2><p>CPU: vzorky zásobníkov všetkých vlákien (collapsed stacks pre flame graph). Pamäť: rozdiel tracemalloc snímok.</p>
+        <form action="/admin_profile" method="post">
+            <div class="form-group" style="max-width:300px;margin:auto;">
+                <label for="profileSeconds">Trvanie (s):</label><input type="number" id="profileSeconds" name="seconds" min="1" max="""" + str(PROFILE_MAX_SECONDS) + """" value="""" + str(PROFILE_DEFAULT_SECONDS) + """">
+                <label for="profilePassword">Admin Heslo:</label><input type="password" id="profilePassword" name="password" required>
+            </div>
+            <div class="button-container" style="border:none;padding-top:0;"><button type="submit" class="button-base button-export">Profilovať CPU</button></div>
+        </form>
+        <form action="/admin_tracemalloc" method="post">
+            <div class="form-group" style="max-width:300px;margin:auto;">
+                <label for="tracemallocPassword">Admin Heslo:</label><input type="password" id="tracemallocPassword" name="password" required>
+            </div>
+            <div class="button-container" style="border:none;padding-top:0;">
+                <button type="submit" name="action" value="start" class="button-base button-save">Spustiť tracemalloc</button>
+                <button type="submit" name="action" value="diff" class="button-base button-export">Rozdiel pamäte</button>
+                <button type="submit" name="action" value="stop" class="button-base button-back">Zastaviť tracemalloc</button>
+            </div>
+        </form>
+    </div>
     <div class="button-container"><a href="/" class="button-base button-back">Späť na Hlavnú Tabuľku</a></div>
     </div></body></html>"""
     return page_html
@@ -340,14 +1712,69 @@ def generate_admin_html(config):
 def get_category_name_from_uid_str(uid_str):
     return CATEGORY_UIDS.get(uid_str, None)
 
-def load_correct_answers_config():
-    global correct_answers_config, PENALTY_PER_INCORRECT, GENERAL_MAX_QUESTIONS, \
-           CATEGORY_DISPLAY_NAMES, NUM_QUESTIONS_PER_CATEGORY, CATEGORY_SECTIONS
+def default_display_names():
+    def_disp_names = {k: f"Kategória {i+1}" for i, k in enumerate(CATEGORY_NAMES_CONFIG_KEYS)}
+    def_disp_names["All Categories"] = "Všetky kategórie"
+    return def_disp_names
+
+class ConfigSnapshot:
+    # Frozen view of one applied config, stamped with a version. Mappings are read-only proxies and sections/answer
+    # keys are tuples, so nothing in a snapshot can change after it is built. publish_config() swaps active_config
+    # to a new snapshot in a single reference assignment; readers take `cfg = active_config` once per request and
+    # never see a half-applied config.
+    __slots__ = ("version", "penalty", "general_max_questions", "num_questions_per_category", "category_display_names",
+                 "category_sections", "answer_keys", "scoring_tables")
+
+    def __init__(self, config, version):
+        gen_max_q = max(1, int(config.get("general_max_questions", 15)))
+        penalty = max(0, int(config.get("penalty", 60)))
+        loaded_num_q_cat = config.get("num_questions_per_category", {})
+        num_q_cat = {k: max(1, min(int(loaded_num_q_cat.get(k, gen_max_q)), gen_max_q)) for k in CATEGORY_NAMES_CONFIG_KEYS}
+        disp_names = default_display_names(); disp_names.update(config.get("category_display_names", {}))
+        loaded_sections = config.get("category_sections", {})
+        cat_sections = {k: tuple((str(sec["name"]), int(sec["num_questions"])) for sec in loaded_sections.get(k, []))
+                        for k in CATEGORY_NAMES_CONFIG_KEYS}
+        loaded_answers = config.get("categories", {})
+        answer_keys = {k: types.MappingProxyType(dict(loaded_answers.get(k, {}))) for k in CATEGORY_NAMES_CONFIG_KEYS}
+        tables = {k: compile_scoring_table(k, num_q_cat[k], answer_keys[k], penalty, cat_sections[k]) for k in CATEGORY_NAMES_CONFIG_KEYS}
+        for slot, value in (("version", version), ("penalty", penalty), ("general_max_questions", gen_max_q),
+                            ("num_questions_per_category", types.MappingProxyType(num_q_cat)),
+                            ("category_display_names", types.MappingProxyType(disp_names)),
+                            ("category_sections", types.MappingProxyType(cat_sections)),
+                            ("answer_keys", types.MappingProxyType(answer_keys)),
+                            ("scoring_tables", types.MappingProxyType(tables))):
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is immutable; publish a new one with publish_config()")
+
+    def scoring_table(self, category_key):
+        table = self.scoring_tables.get(category_key)
+        if table is None: # Category not in the config (e.g. an old entry): score against an empty key
+            table = compile_scoring_table(category_key, self.general_max_questions, {}, self.penalty, ())
+        return table
+
+    def to_dict(self):
+        # Fresh, mutable config dict in the correct_answers.json layout (for editing and saving)
+        return {
+            "penalty": self.penalty, "general_max_questions": self.general_max_questions,
+            "num_questions_per_category": dict(self.num_questions_per_category),
+            "category_display_names": dict(self.category_display_names),
+            "categories": {k: dict(v) for k, v in self.answer_keys.items()},
+            "category_sections": {k: [{"name": n, "num_questions": q} for n, q in v] for k, v in self.category_sections.items()},
+        }
+
+active_config = ConfigSnapshot({}, 0) # Defaults until load_correct_answers_config() runs
+
+def publish_config(config):
+    global active_config
+    active_config = ConfigSnapshot(config, active_config.version + 1) # The only place the config changes
+    leaderboard_events.publish() # Display names may have changed in every table
 
+def load_correct_answers_config():
     def_penalty = 60; def_gen_max_q = 15
     def_num_q_cat = {k: def_gen_max_q for k in CATEGORY_NAMES_CONFIG_KEYS}
-    def_disp_names = {k: f"Kategória {i+1}" for i, k in enumerate(CATEGORY_NAMES_CONFIG_KEYS)}
-    def_disp_names["All Categories"] = "Všetky kategórie"
+    def_disp_names = default_display_names()
     def_cat_sections = {k: [] for k in CATEGORY_NAMES_CONFIG_KEYS}
 
     default_struct = {
@@ -357,34 +1784,26 @@ def load_correct_answers_config():
         "categories": {k: {} for k in CATEGORY_NAMES_CONFIG_KEYS},
         "category_sections": def_cat_sections.copy()
     }
-    if not os.path.exists(correct_answers_file):
-        print(f"{correct_answers_file} not found. Creating with defaults.")
-        correct_answers_config = default_struct.copy()
-        save_correct_answers_config(correct_answers_config) # This will also set globals
-
     try:
-        with open(correct_answers_file, "r", encoding="utf-8") as f:
-            config = json.load(f)
+        config = leaderboard_storage.load_config()
+        if config is None:
+            print(f"No stored config ({leaderboard_storage.name} storage). Creating with defaults.")
+            save_correct_answers_config(default_struct.copy()) # This also publishes the config
+            return
         if not isinstance(config, dict) or not all(k in config for k in default_struct.keys()):
             raise ValueError("Invalid config structure, reverting to defaults.")
         
-        correct_answers_config = config # Store loaded config
-        PENALTY_PER_INCORRECT = max(0, int(config.get("penalty", def_penalty)))
-        GENERAL_MAX_QUESTIONS = max(1, int(config.get("general_max_questions", def_gen_max_q)))
-        
+        gen_max_q = max(1, int(config.get("general_max_questions", def_gen_max_q)))
         loaded_num_q_cat = config.get("num_questions_per_category", def_num_q_cat)
-        NUM_QUESTIONS_PER_CATEGORY = {k: max(1, min(int(loaded_num_q_cat.get(k, def_gen_max_q)), GENERAL_MAX_QUESTIONS)) for k in CATEGORY_NAMES_CONFIG_KEYS}
+        num_q_cat = {k: max(1, min(int(loaded_num_q_cat.get(k, def_gen_max_q)), gen_max_q)) for k in CATEGORY_NAMES_CONFIG_KEYS}
 
-        loaded_disp_names = config.get("category_display_names", def_disp_names)
-        CATEGORY_DISPLAY_NAMES = def_disp_names.copy(); CATEGORY_DISPLAY_NAMES.update(loaded_disp_names)
-        
         loaded_cat_sections = config.get("category_sections", def_cat_sections)
-        CATEGORY_SECTIONS = {k: [] for k in CATEGORY_NAMES_CONFIG_KEYS} # Ensure all keys exist
+        cat_sections = {k: [] for k in CATEGORY_NAMES_CONFIG_KEYS} # Ensure all keys exist
         for cat_k, sections_list in loaded_cat_sections.items():
-            if cat_k in CATEGORY_SECTIONS and isinstance(sections_list, list):
+            if cat_k in cat_sections and isinstance(sections_list, list):
                 valid_sections = []
                 current_sum_q = 0
-                total_q_for_cat_val = NUM_QUESTIONS_PER_CATEGORY.get(cat_k, 0)
+                total_q_for_cat_val = num_q_cat.get(cat_k, 0)
                 for sec_item in sections_list:
                     if isinstance(sec_item, dict) and "name" in sec_item and "num_questions" in sec_item:
                         try:
@@ -397,19 +1816,23 @@ def load_correct_answers_config():
                 # This is more for data integrity check; admin UI/save is stricter
                 if valid_sections and current_sum_q != total_q_for_cat_val:
                     print(f"Warning on load: For '{cat_k}', section sum ({current_sum_q}) != total Q ({total_q_for_cat_val}). Using loaded sections but review needed.")
-                CATEGORY_SECTIONS[cat_k] = valid_sections
-
+                cat_sections[cat_k] = valid_sections
+
+        publish_config({
+            "penalty": config.get("penalty", def_penalty), "general_max_questions": gen_max_q,
+            "num_questions_per_category": num_q_cat,
+            "category_display_names": config.get("category_display_names", def_disp_names),
+            "categories": config.get("categories", {}), "category_sections": cat_sections,
+        })
         print("Config loaded from file.")
 
     except Exception as e:
         print(f"Error loading or validating config: {e}. Using/saving defaults.")
-        correct_answers_config = default_struct.copy() # Use pristine defaults
-        save_correct_answers_config(correct_answers_config) # This re-saves and sets globals from defaults
+        save_correct_answers_config(default_struct.copy()) # Pristine defaults; this re-saves and publishes them
 
 
+@runs_on_state_owner
 def save_correct_answers_config(config_to_save):
-    global correct_answers_config, PENALTY_PER_INCORRECT, GENERAL_MAX_QUESTIONS, \
-           CATEGORY_DISPLAY_NAMES, NUM_QUESTIONS_PER_CATEGORY, CATEGORY_SECTIONS
     try:
         # Ensure all top-level keys from default_struct are present
         for key, default_value in {
@@ -464,129 +1887,455 @@ def save_correct_answers_config(config_to_save):
             else: config_to_save["categories"][cat_key_s] = {}
 
 
-        with open(correct_answers_file, "w", encoding="utf-8") as f:
-            json.dump(config_to_save, f, ensure_ascii=False, indent=4)
+        leaderboard_storage.save_config(config_to_save)
         print("Config and answers saved successfully.")
 
-        # Update globals from the successfully saved and validated config
-        correct_answers_config = config_to_save.copy() # Use a copy
-        PENALTY_PER_INCORRECT = correct_answers_config["penalty"]
-        GENERAL_MAX_QUESTIONS = correct_answers_config["general_max_questions"]
-        NUM_QUESTIONS_PER_CATEGORY = correct_answers_config["num_questions_per_category"].copy()
-        CATEGORY_DISPLAY_NAMES = correct_answers_config["category_display_names"].copy()
-        CATEGORY_SECTIONS = correct_answers_config["category_sections"].copy()
+        # Publish the successfully saved and validated config as a new snapshot
+        publish_config(config_to_save)
 
     except Exception as e:
         print(f"CRITICAL Error during save_correct_answers_config: {e}")
         import traceback; traceback.print_exc()
 
 
-def get_correct_answers_for_category(glob_config, category_key_lookup):
-    return glob_config.get("categories", {}).get(category_key_lookup, {})
-
-def filter_leaderboard_by_category(lb_data, cat_key_filter):
-    if cat_key_filter == "All Categories" or not cat_key_filter: return lb_data
-    return [entry for entry in lb_data if entry.get("category") == cat_key_filter]
+def filter_leaderboard_by_category(board, cat_key_filter):
+    return board.iter_entries(cat_key_filter) # Lazy over one snapshot; "All Categories" is merged on the fly
+
+# --- Bulk Rescoring (after the answer key, question counts or penalty change) ---
+def rescore_answer_rows(answer_codes, table):
+    # ScoringTable.score for many rows at once. Returns (penalties, disqualified_flags) as lists.
+    if np is None:
+        scores = [table.score(codes) for codes in answer_codes]
+        return [p for p, _ in scores], [dq for _, dq in scores]
+    num_q = table.num_questions
+    width = max([num_q] + [len(c) for c in answer_codes])
+    padded = "".join(c.ljust(width, ANSWER_CODE_MISSING) for c in answer_codes).encode("ascii")
+    codes = np.frombuffer(padded, dtype=np.uint8).reshape(len(answer_codes), width)
+    key = np.frombuffer(table.key_codes.encode("ascii"), dtype=np.uint8)
+    missing_char = ord(ANSWER_CODE_MISSING)
+    scored = codes[:, :num_q]
+    missing = scored == missing_char
+    disqualified = (codes != missing_char).sum(axis=1) < num_q
+    wrong = missing | ((key != missing_char) & (scored != key))
+    penalties = np.where(disqualified, missing.sum(axis=1), wrong.sum(axis=1)) * table.penalty
+    return penalties.tolist(), disqualified.tolist()
+
+class RescoreJob:
+    # Background rescore of the whole board against the current config. Scoring, sorting and building the new board
+    # run in its own thread on a snapshot; the state owner only swaps it in and merges back the results stored in the
+    # meantime (those were already scored with the new config). A request while running schedules exactly one rerun.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = "idle"; self.processed = 0; self.total = 0; self.changed = 0
+        self.started_at = None; self.finished_at = None; self.error = None
+        self._rerun = False
+
+    def status(self):
+        return {"state": self.state, "processed": self.processed, "total": self.total, "changed": self.changed,
+                "started_at": self.started_at, "finished_at": self.finished_at, "error": self.error,
+                "rerun_pending": self._rerun, "vectorized": np is not None}
+
+    def start(self):
+        with self._lock:
+            if self.state == "running": self._rerun = True; return False
+            self.state = "running"; self._rerun = False
+        threading.Thread(target=self._run, name="RescoreJob", daemon=True).start()
+        return True
+
+    def _run(self):
+        while True:
+            self.processed = 0; self.changed = 0; self.error = None
+            self.started_at = time.time(); self.finished_at = None
+            try:
+                for _ in range(RESCORE_APPLY_ATTEMPTS):
+                    # Everything but the swap happens here, off the state owner: score, sort, build the new board
+                    base = leaderboard_store.snapshot(); entries = base.view()
+                    self.processed = 0; rescored = self._rescore(entries)
+                    if not rescored: break
+                    updated = [rescored.get(id(entry), entry) for entry in entries]
+                    updated.sort(key=leaderboard_sort_key) # Stable: previous order still breaks ties
+                    if apply_rescored_board(leaderboard_store.prepare(updated), base.version) is not None:
+                        self.changed = len(rescored); break
+                else: raise RuntimeError("the board changed too much during the rescore to apply it")
+                print(f"Rescore finished: {self.total} entries checked, {self.changed} changed.")
+            except Exception as e_rescore:
+                self.error = str(e_rescore); print(f"Error during rescore: {e_rescore}")
+            self.finished_at = time.time()
+            with self._lock:
+                if not self._rerun:
+                    self.state = "failed" if self.error else "done"; return
+                self._rerun = False
+
+    def _rescore(self, entries):
+        self.total = len(entries)
+        cfg = active_config
+        by_category = {}
+        for entry in entries:
+            if isinstance(entry.get("answers"), str): by_category.setdefault(entry.get("category"), []).append(entry)
+            else: self.processed += 1 # Recorded before answers were stored; cannot be rescored
+        rescored = {}
+        for category_key, cat_entries in by_category.items():
+            table = cfg.scoring_table(category_key)
+            for chunk_start in range(0, len(cat_entries), RESCORE_CHUNK_ROWS):
+                chunk = cat_entries[chunk_start:chunk_start + RESCORE_CHUNK_ROWS]
+                penalties, dq_flags = rescore_answer_rows([e["answers"] for e in chunk], table)
+                for entry, new_penalty, new_dq in zip(chunk, penalties, dq_flags):
+                    new_penalty = int(new_penalty); new_dq = bool(new_dq)
+                    if new_penalty != entry.get("penalty") or new_dq != entry.get("disqualified"):
+                        rescored[id(entry)] = dict(entry, penalty=new_penalty, disqualified=new_dq,
+                                                   time=entry.get("original_time", 0) + new_penalty)
+                self.processed += len(chunk)
+        return rescored
+
+@runs_on_state_owner
+def apply_rescored_board(prepared, base_version):
+    # Swaps in the board the rescore job built (LeaderboardStore.prepare) from the snapshot at base_version. Results
+    # stored since then were scored with the new config and are merged back on top from the changelog; returns None
+    # when the changelog can't tell (board reset or too many changes), and the job rebuilds from a fresh snapshot.
+    newer = leaderboard_store.snapshot().changes_since(base_version)
+    if newer is None: return None
+    leaderboard_store.install(prepared)
+    for _, entry in newer: leaderboard_store.upsert(entry)
+    leaderboard_events.publish()
+    return rewrite_leaderboard_storage(leaderboard_store.snapshot())
+
+async def rewrite_leaderboard_storage(board):
+    # Full rewrite from an immutable snapshot in an executor, awaited by the state owner (the board changed wholesale)
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: timed(storage_write_seconds, "replace")(leaderboard_storage.replace_entries)(board.view()))
+        print("Leaderboard saved to file.")
+    except Exception as e: print(f"Error saving leaderboard: {e}")
+    return True
+
+rescore_job = RescoreJob()
+
+# --- Serial Ingest ---
+class SerialLineFramer:
+    # Newline framing over one bytearray. Complete lines are decoded straight from memoryview slices,
+    # the consumed prefix is dropped once per chunk, and a partial line (even one ending mid-character,
+    # e.g. in the middle of a Slovak diacritic) simply waits in the buffer for the rest of its bytes.
+    def __init__(self, max_line_bytes=SERIAL_MAX_LINE_BYTES):
+        self._buffer = bytearray()
+        self._scan_from = 0 # Bytes before this offset are known to contain no newline
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self.max_line_bytes = max_line_bytes
+
+    def feed(self, chunk):
+        buf = self._buffer
+        buf += chunk
+        lines = []
+        newline_at = buf.find(b"\n", self._scan_from)
+        if newline_at != -1:
+            line_start = 0
+            with memoryview(buf) as view:
+                while newline_at != -1:
+                    lines.append(self._decoder.decode(view[line_start:newline_at], final=True))
+                    line_start = newline_at + 1
+                    newline_at = buf.find(b"\n", line_start)
+            del buf[:line_start]
+        self._scan_from = len(buf)
+        if len(buf) > self.max_line_bytes:
+            print(f"Warning: Dropping {len(buf)} serial bytes without a newline.")
+            buf.clear(); self._scan_from = 0
+        return lines
+
+@timed(serial_line_seconds)
+def process_serial_line(json_line):
+    # Serial results bypass admission control: the bridge has already acked the device and doesn't relay NAKs, so a
+    # refused result would be lost for good. On a full queue they are deferred (kept) by the state owner instead.
+    received_at = time.perf_counter()
+    json_line = json_line.strip()
+    if not json_line: return
+    try:
+        parsed_data = json.loads(json_line)
+        if isinstance(parsed_data,dict) and all(k in parsed_data for k in ["name","time","answers","category_uid"]) and isinstance(parsed_data["answers"], dict):
+            cat_k = get_category_name_from_uid_str(parsed_data["category_uid"])
+            submission_id = submission_id_from_payload(parsed_data)
+            if submission_dedupe.is_duplicate(submission_id):
+                print(f"Duplicate submission {submission_id} from serial ignored (already stored).")
+            elif cat_k:
+                add_to_leaderboard(parsed_data["name"], float(parsed_data["time"]), parsed_data["answers"], cat_k, submission_id, received_at)
+            else: print(f"Warning: Unrecognized category UID from serial: {parsed_data['category_uid']}")
+        else: print(f"Warning: Invalid JSON structure from serial: {json_line}")
+    except json.JSONDecodeError: print(f"Serial JSON decode error: '{json_line}'")
+    except Exception as proc_err: print(f"Error processing serial data ('{json_line}'): {proc_err}")
+
+async def serial_ingest_task():
+    # Reads the bridge without a thread: the port's fd is registered with the event loop (POSIX).
+    # pyserial has no pollable handle on Windows, so there the blocking listener runs in a worker thread instead.
+    # An unplugged bridge fails the read at once; its return is polled every SERIAL_HOTPLUG_POLL_INTERVAL and a port
+    # that is present but won't open is retried with jittered backoff.
+    if SERIAL_PORT is None and serial_bridge_match is None: print("Serial port not set for listener."); return
+    loop = asyncio.get_running_loop()
+    if os.name != "posix":
+        await loop.run_in_executor(None, serial_listener); return
+    backoff = SerialReconnectBackoff(); waiting_logged = False
+    while True:
+        port_name = resolve_serial_port()
+        if port_name is None:
+            if not waiting_logged: print("Waiting for the serial bridge to be plugged in..."); waiting_logged = True
+            await asyncio.sleep(SERIAL_HOTPLUG_POLL_INTERVAL); continue
+        waiting_logged = False
+        active_connection = None; reader_fd = None; connected_at = None; retry_delay = 0
+        try:
+            print(f"Attempting serial connection to {port_name}...")
+            active_connection = serial.Serial(port_name, BAUD_RATE, timeout=0) # Non-blocking reads
+            connected_at = time.perf_counter()
+            print(f"Serial connected: {port_name}")
+            connection_lost = loop.create_future()
+            line_framer = SerialLineFramer()
+            def on_serial_readable():
+                try: chunk = active_connection.read(active_connection.in_waiting or 1)
+                except (serial.SerialException, OSError) as ser_err: # An unplugged adapter fails in_waiting with EIO
+                    if not connection_lost.done(): connection_lost.set_exception(ser_err)
+                    return
+                for json_line in line_framer.feed(chunk):
+                    process_serial_line(json_line) # Mutations are queued to the state owner, never applied here
+            reader_fd = active_connection.fileno()
+            loop.add_reader(reader_fd, on_serial_readable)
+            await connection_lost
+        except Exception as e_listen:
+            # Only a connection that held for a while resets the backoff, so a flapping port can't spin
+            if connected_at is not None and time.perf_counter() - connected_at > SERIAL_RECONNECT_MAX_DELAY: backoff.reset()
+            retry_delay = backoff.next_delay()
+            error_kind = "Serial connection error" if isinstance(e_listen, (serial.SerialException, OSError)) else "Unexpected error in serial ingest"
+            print(f"{error_kind} ({port_name}): {e_listen}. Retrying in {retry_delay:.2f}s...")
+        finally:
+            if reader_fd is not None: loop.remove_reader(reader_fd)
+            if active_connection and active_connection.is_open: active_connection.close()
+        await asyncio.sleep(retry_delay)
 
-# --- Serial Listener Thread ---
 def serial_listener():
-    global leaderboard_data, correct_answers_config, SERIAL_PORT, BAUD_RATE
-    if SERIAL_PORT is None: print("Serial port not set for listener."); return
-    active_connection = None
+    global SERIAL_PORT, BAUD_RATE
+    if SERIAL_PORT is None and serial_bridge_match is None: print("Serial port not set for listener."); return
+    active_connection = None; backoff = SerialReconnectBackoff(); waiting_logged = False
     while True:
+        port_name = resolve_serial_port()
+        if port_name is None:
+            if not waiting_logged: print("Waiting for the serial bridge to be plugged in..."); waiting_logged = True
+            time.sleep(SERIAL_HOTPLUG_POLL_INTERVAL); continue
+        waiting_logged = False; connected_at = None
         try:
-            print(f"Attempting serial connection to {SERIAL_PORT}...")
-            active_connection = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-            print(f"Serial connected: {SERIAL_PORT}")
-            data_buffer = ""
+            print(f"Attempting serial connection to {port_name}...")
+            active_connection = serial.Serial(port_name, BAUD_RATE, timeout=SERIAL_READ_TIMEOUT)
+            connected_at = time.perf_counter()
+            print(f"Serial connected: {port_name}")
+            line_framer = SerialLineFramer()
             while True: # Inner loop for reading data
-                if active_connection.in_waiting > 0:
-                    data_buffer += active_connection.read(active_connection.in_waiting).decode('utf-8', errors='ignore')
-                    while '\n' in data_buffer:
-                        json_line, data_buffer = data_buffer.split('\n', 1)
-                        json_line = json_line.strip()
-                        if not json_line: continue
-                        try:
-                            parsed_data = json.loads(json_line)
-                            if isinstance(parsed_data,dict) and all(k in parsed_data for k in ["name","time","answers","category_uid"]):
-                                cat_k = get_category_name_from_uid_str(parsed_data["category_uid"])
-                                if cat_k:
-                                    add_to_leaderboard(parsed_data["name"], float(parsed_data["time"]), parsed_data["answers"], cat_k)
-                                else: print(f"Warning: Unrecognized category UID from serial: {parsed_data['category_uid']}")
-                            else: print(f"Warning: Invalid JSON structure from serial: {json_line}")
-                        except json.JSONDecodeError: print(f"Serial JSON decode error: '{json_line}'")
-                        except Exception as proc_err: print(f"Error processing serial data ('{json_line}'): {proc_err}")
-                time.sleep(0.05) # Polling interval
-        except serial.SerialException as ser_err:
-            print(f"Serial connection error ({SERIAL_PORT}): {ser_err}. Retrying in 5s...")
-            if active_connection and active_connection.is_open: active_connection.close()
-            active_connection = None; time.sleep(5)
+                # Blocks until at least one byte arrives (or the timeout passes), then takes whatever else is waiting
+                chunk = active_connection.read(max(1, active_connection.in_waiting))
+                if not chunk: continue
+                for json_line in line_framer.feed(chunk):
+                    process_serial_line(json_line)
         except KeyboardInterrupt: print("Serial listener stopping."); break
         except Exception as e_listen:
-            print(f"Unexpected error in serial listener: {e_listen}. Retrying in 10s...")
+            if connected_at is not None and time.perf_counter() - connected_at > SERIAL_RECONNECT_MAX_DELAY: backoff.reset()
+            retry_delay = backoff.next_delay()
+            error_kind = "Serial connection error" if isinstance(e_listen, (serial.SerialException, OSError)) else "Unexpected error in serial listener"
+            print(f"{error_kind} ({port_name}): {e_listen}. Retrying in {retry_delay:.2f}s...")
             if active_connection and active_connection.is_open: active_connection.close()
-            active_connection = None; time.sleep(10)
+            active_connection = None; time.sleep(retry_delay)
     if active_connection and active_connection.is_open: active_connection.close()
     print("Serial listener terminated.")
 
 
 # --- HTTP Request Handler (MODIFIED) ---
+METRIC_ROUTES = frozenset(("/", "/admin", "/leaderboard_table", "/api/leaderboard", "/api/rank", "/api/search", "/admin_rescore_status",
+                            "/api/ingest_stats", "/leaderboard_excel", "/leaderboard_excel_category", "/metrics", "/save_answers",
+                            "/admin_reset", "/admin_freeze", "/admin_manual_add", "/admin_profile", "/admin_tracemalloc", "/add"))
+
+def metric_route(request_path):
+    # Bounded route label: known routes as they are, every static asset as /static/, the rest as "other"
+    route_path = urllib.parse.urlparse(request_path).path
+    if route_path.startswith("/static/"): return "/static/"
+    return route_path if route_path in METRIC_ROUTES else "other"
+
+def timed_request(method):
+    @functools.wraps(method)
+    def timed_method(self):
+        started = time.perf_counter(); self.response_status = None
+        try: return method(self)
+        finally: http_request_seconds.observe(time.perf_counter() - started, self.command, metric_route(self.path), str(self.response_status))
+    return timed_method
+
+def render_metrics():
+    # Histograms from the registry plus gauges/counters read at scrape time
+    lines = []
+    for metric in metrics_registry: metric.render(lines)
+    board = leaderboard_store.snapshot(); stats = leaderboard_state.stats()
+    lines += ["# HELP leaderboard_entries Results on the board per category.", "# TYPE leaderboard_entries gauge"]
+    lines += [f'leaderboard_entries{{category="{metric_label_value(cat_key)}"}} {len(pairs)}' for cat_key, pairs in board.by_category.items()]
+    lines += ["# HELP leaderboard_board_version Board version (increases with every change).", "# TYPE leaderboard_board_version gauge",
+              f"leaderboard_board_version {board.version}",
+              "# HELP leaderboard_ingest_queue_depth Results and mutations waiting for the state owner.", "# TYPE leaderboard_ingest_queue_depth gauge",
+              f"leaderboard_ingest_queue_depth {stats['queue_depth']}"]
+    for counter_name, stat_key, help_text in (
+            ("leaderboard_results_committed_total", "results_committed", "Results committed to storage."),
+            ("leaderboard_storage_commits_total", "journal_writes", "Storage writes by the group committer."),
+            ("leaderboard_ingest_deferred_total", "deferred_puts", "Submissions that waited for room in the full ingest queue."),
+            ("leaderboard_duplicate_submissions_total", "duplicate_submissions", "Retried submissions acked without being applied."),
+            ("leaderboard_ingest_admitted_total", "admitted", "Submissions admitted by the per-source rate limit.")):
+        lines += [f"# HELP {counter_name} {help_text}", f"# TYPE {counter_name} counter", f"{counter_name} {stats[stat_key]}"]
+    lines += ["# HELP leaderboard_startup_seconds Seconds from process start to listening / to the first request served.",
+              "# TYPE leaderboard_startup_seconds gauge"]
+    lines += [f'leaderboard_startup_seconds{{phase="{phase}"}} {seconds:.6f}' for phase, seconds in startup_timings.items()]
+    lines += ["# HELP leaderboard_ingest_shed_total Submissions refused for overload.", "# TYPE leaderboard_ingest_shed_total counter",
+              f'leaderboard_ingest_shed_total{{reason="rate_limited"}} {stats["shed_rate_limited"]}',
+              f'leaderboard_ingest_shed_total{{reason="queue_full"}} {stats["shed_queue_full"]}']
+    return "\n".join(lines) + "\n"
+
+# --- Profiling (admin, on demand; nothing runs or traces until asked) ---
+profile_lock = threading.Lock() # One sampling run at a time
+tracemalloc_lock = threading.Lock()
+tracemalloc_baseline = None # Snapshot the next diff is taken against, while tracing
+
+def sample_thread_stacks(duration, interval=PROFILE_SAMPLE_INTERVAL):
+    # Samples the Python stack of every thread but the caller's for duration seconds. Returns (samples, collapsed)
+    # where collapsed maps "thread;outermost;...;innermost" to its sample count (flamegraph.pl / speedscope input).
+    own_ident = threading.get_ident(); stack_counts = {}; samples = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident: continue
+            frames = []
+            while frame is not None:
+                frames.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            frames.append(thread_names.get(ident, f"thread-{ident}").replace(" ", "_"))
+            stack = ";".join(reversed(frames))
+            stack_counts[stack] = stack_counts.get(stack, 0) + 1
+        samples += 1
+        time.sleep(interval)
+    return samples, stack_counts
+
+def tracemalloc_snapshot():
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                      tracemalloc.Filter(False, "<frozen importlib._bootstrap>")))
+
+def run_tracemalloc_action(action):
+    # start: begin tracing and take the baseline; diff: top allocation changes since the previous snapshot
+    # (which becomes the new baseline); stop: stop tracing and free its memory. Returns the report text.
+    global tracemalloc_baseline
+    with tracemalloc_lock:
+        if action == "start":
+            if not tracemalloc.is_tracing(): tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracemalloc_baseline = tracemalloc_snapshot()
+            return "tracemalloc started; request a diff after reproducing the problem.\n"
+        if action == "stop":
+            tracemalloc.stop(); tracemalloc_baseline = None
+            return "tracemalloc stopped.\n"
+        if action != "diff": raise ValueError(f"Unknown tracemalloc action '{action}'.")
+        if not tracemalloc.is_tracing() or tracemalloc_baseline is None: raise ValueError("tracemalloc is not running; start it first.")
+        snapshot = tracemalloc_snapshot()
+        stat_diffs = snapshot.compare_to(tracemalloc_baseline, "lineno"); tracemalloc_baseline = snapshot
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        report_lines = [f"Traced: {current_bytes / 1024:.1f} KiB now, {peak_bytes / 1024:.1f} KiB peak. "
+                        f"Top {TRACEMALLOC_TOP} changes since the previous snapshot:"]
+        report_lines += [str(stat_diff) for stat_diff in stat_diffs[:TRACEMALLOC_TOP]]
+        return "\n".join(report_lines) + "\n"
+
 class SimpleRequestHandler(BaseHTTPRequestHandler):
     def log_message(self, format_str, *args_list): return # Quieter logging
 
-    @staticmethod # Make it static so it can be called without an instance if needed by generate_admin_html
-    def get_admin_sections_script(dummy_self_param_to_match_method_signature=None):
-        # JavaScript for dynamically adding/removing sections and validating sums
-        return """<script>
-        let sectionCounters = {};
-        function initializeSectionCounters() { const cK = """ + json.dumps(CATEGORY_NAMES_CONFIG_KEYS) + """;cK.forEach(k=>{const co=document.getElementById('sections_container_'+k);sectionCounters[k]=co?co.getElementsByClassName('section-entry').length:0;});}
-        function addSectionEntry(cK,maxQTotal){const co=document.getElementById('sections_container_'+cK);if(!co)return;const sIdx=sectionCounters[cK]++;const eD=document.createElement('div');eD.className='section-entry';eD.id=`section_entry_${cK}_${sIdx}`;eD.innerHTML=`<label for="section_name_${cK}_${sIdx}">Názov:</label><input type="text" name="section_name_${cK}[]" id="section_name_${cK}_${sIdx}" placeholder="Názov sekcie" required><label for="section_q_count_${cK}_${sIdx}">Otázok:</label><input type="number" name="section_q_count_${cK}[]" id="section_q_count_${cK}_${sIdx}" value="1" min="1" max="${maxQTotal}" required oninput="updateCategorySectionSum('${cK}')"><button type="button" class="button-base button-remove-section" onclick="removeSectionEntry('section_entry_${cK}_${sIdx}','${cK}')">Odstrániť</button>`;co.appendChild(eD);updateCategorySectionSum(cK);}
-        function removeSectionEntry(eId,cK){const e=document.getElementById(eId);if(e)e.remove();updateCategorySectionSum(cK);}
-        function updateCategorySectionSum(cK){const co=document.getElementById('sections_container_'+cK);const tQI=document.getElementById('num_questions_'+cK);const sID=document.getElementById('section_sum_info_'+cK);const eDv=document.getElementById('sections_validation_error_'+cK);if(!co||!tQI||!sID||!eDv)return;const tA=parseInt(tQI.value)||0;let cSS=0;const sQIs=co.querySelectorAll('input[name^="section_q_count_'+cK+'"]');sQIs.forEach(i=>{cSS+=parseInt(i.value)||0;});sID.textContent=`Súčet v sekciách: ${cSS} / ${tA}`;if(cSS!==tA&&sQIs.length>0){eDv.textContent='POZOR: Súčet v sekciách sa nerovná celkovému počtu otázok!';sID.style.color='red';tQI.style.borderColor='red';}else{eDv.textContent='';sID.style.color=cSS===tA&&sQIs.length>0?'green':'#007bff';tQI.style.borderColor='';}}
-        document.addEventListener('DOMContentLoaded',()=>{initializeSectionCounters();const cK=""" + json.dumps(CATEGORY_NAMES_CONFIG_KEYS) + """;cK.forEach(k=>{updateCategorySectionSum(k);const tCI=document.getElementById('num_questions_'+k);if(tCI)tCI.addEventListener('input',()=>updateCategorySectionSum(k));});});
-        </script>"""
+    def send_response(self, code, message=None):
+        self.response_status = code # For the request metrics
+        super().send_response(code, message)
 
+    @timed_request
     def do_GET(self):
-        global leaderboard_data, correct_answers_config, CATEGORY_DISPLAY_NAMES, CATEGORY_NAMES_CONFIG_KEYS
+        global CATEGORY_NAMES_CONFIG_KEYS
         parsed_url = urllib.parse.urlparse(self.path)
         req_path = parsed_url.path
         query_data = urllib.parse.parse_qs(parsed_url.query)
+        cfg = active_config # One config snapshot for the whole request
 
         try:
             if req_path == "/":
                 sel_cat_key = query_data.get("category", ["All Categories"])[0]
-                if sel_cat_key not in CATEGORY_DISPLAY_NAMES: sel_cat_key = "All Categories"
-                filtered_lb_data = filter_leaderboard_by_category(list(leaderboard_data), sel_cat_key)
-                self.send_html_response(generate_leaderboard_html(filtered_lb_data, sel_cat_key))
+                if sel_cat_key not in cfg.category_display_names: sel_cat_key = "All Categories"
+                try: window = parse_leaderboard_window(query_data)
+                except ValueError: self.send_error(400, "Bad Request", "offset and limit must be non-negative integers."); return
+                table_etag, table_body = get_leaderboard_table_render(sel_cat_key, cfg, window)
+                self.send_html_response(render_leaderboard_page(table_etag, table_body, cfg, sel_cat_key), ("page", table_etag))
             elif req_path == "/admin":
-                self.send_html_response(generate_admin_html(correct_answers_config.copy())) # Pass a copy
+                freeze_status = describe_freeze_status()
+                self.send_html_response(render_admin_page(cfg, freeze_status), ("admin", cfg.version, freeze_status))
             elif req_path == "/leaderboard_table":
                 sel_cat_key_table = query_data.get("category", ["All Categories"])[0]
-                if sel_cat_key_table not in CATEGORY_DISPLAY_NAMES: sel_cat_key_table = "All Categories"
-                filtered_lb_table = filter_leaderboard_by_category(list(leaderboard_data), sel_cat_key_table)
-                table_html_content = generate_leaderboard_table_html(filtered_lb_table)
-                self.send_response(200); self.send_header("Content-type", "text/html; charset=utf-8"); self.send_header("Cache-Control", "no-cache")
-                self.end_headers(); self.wfile.write(table_html_content.encode("utf-8"))
-            elif req_path == "/leaderboard_excel":
-                self.send_csv_response(generate_leaderboard_csv(list(leaderboard_data)), "leaderboard_vsetky_kategorie.csv")
-            elif req_path == "/leaderboard_excel_category":
+                if sel_cat_key_table not in cfg.category_display_names: sel_cat_key_table = "All Categories"
+                try: window = parse_leaderboard_window(query_data)
+                except ValueError: self.send_error(400, "Bad Request", "offset and limit must be non-negative integers."); return
+                table_etag, table_body = get_leaderboard_table_render(sel_cat_key_table, cfg, window)
+                encoding = self.response_encoding("text/html", len(table_body))
+                if_none_match = self.headers.get("If-None-Match")
+                if etag_matches(if_none_match, table_etag) or etag_matches(if_none_match, etag_for_encoding(table_etag, encoding)):
+                    self.send_response(304); self.send_header("ETag", etag_for_encoding(table_etag, encoding))
+                    self.send_header("Cache-Control", "no-cache"); self.send_header("Vary", "Accept-Encoding")
+                    self.end_headers(); return
+                self.send_body("text/html; charset=utf-8", table_body, ("table", table_etag),
+                               (("Cache-Control", "no-cache"), ("ETag", etag_for_encoding(table_etag, encoding))))
+            elif req_path.startswith("/static/"):
+                asset = static_assets.get(req_path)
+                if asset is None: self.send_error(404, "Not Found", f"Resource '{req_path}' not found."); return
+                self.send_body(asset[0], asset[1], ("static", req_path),
+                               (("Cache-Control", "public, max-age=31536000, immutable"), ("ETag", f'"{req_path[8:].split(".")[0]}"')))
+            elif req_path == "/api/leaderboard":
+                sel_cat_key_api = query_data.get("category", ["All Categories"])[0]
+                if sel_cat_key_api not in cfg.category_display_names: sel_cat_key_api = "All Categories"
+                try:
+                    since_version = int(query_data["since"][0]) if "since" in query_data else None
+                    config_version_seen = int(query_data["config"][0]) if "config" in query_data else cfg.version
+                    window = parse_leaderboard_window(query_data)
+                except ValueError: self.send_error(400, "Bad Request", "since, config, offset and limit must be integers."); return
+                self.send_json_response(build_leaderboard_payload(sel_cat_key_api, since_version, config_version_seen, cfg, window))
+            elif req_path == "/api/rank":
+                rank_name = query_data.get("name", [""])[0]
+                if not rank_name.strip(): self.send_error(400, "Bad Request", "name is required."); return
+                sel_cat_key_rank = query_data.get("category", ["All Categories"])[0]
+                if sel_cat_key_rank not in cfg.category_display_names: sel_cat_key_rank = "All Categories"
+                rank_payload, found = build_rank_payload(rank_name, sel_cat_key_rank, cfg)
+                self.send_json_response(rank_payload, 200 if found else 404)
+            elif req_path == "/api/search":
+                search_query = query_data.get("q", [""])[0]
+                sel_cat_key_search = query_data.get("category", ["All Categories"])[0]
+                if sel_cat_key_search not in cfg.category_display_names: sel_cat_key_search = "All Categories"
+                try: search_limit = max(1, min(int(query_data.get("limit", [SEARCH_RESULTS_MAX])[0]), SEARCH_RESULTS_MAX))
+                except ValueError: self.send_error(400, "Bad Request", "limit must be an integer."); return
+                self.send_json_response(build_search_payload(search_query, sel_cat_key_search, search_limit, cfg))
+            elif req_path == "/admin_rescore_status":
+                self.send_json_response(rescore_job.status())
+            elif req_path == "/api/ingest_stats":
+                self.send_json_response(leaderboard_state.stats())
+            elif req_path == "/metrics":
+                self.send_body("text/plain; version=0.0.4; charset=utf-8", render_metrics().encode("utf-8"), None, (("Cache-Control", "no-cache"),))
+            elif req_path in ("/leaderboard_excel", "/leaderboard_excel_category"):
+                export_format = query_data.get("format", ["csv"])[0]
+                if export_format not in EXPORT_FORMATS:
+                    self.send_error(400, "Bad Request", "Unknown export format."); return
+                if req_path == "/leaderboard_excel":
+                    self.send_export_response(export_format, "All Categories", "leaderboard_vsetky_kategorie", cfg); return
                 cat_key_csv = query_data.get("category", [""])[0]
                 if cat_key_csv not in CATEGORY_NAMES_CONFIG_KEYS: # Ensure valid category for specific export
-                    self.send_error(400, "Bad Request", "Invalid category for CSV export."); return
-                filtered_lb_csv = filter_leaderboard_by_category(list(leaderboard_data), cat_key_csv)
-                file_name_csv = f"leaderboard_{CATEGORY_DISPLAY_NAMES.get(cat_key_csv,cat_key_csv).replace(' ','_')}.csv"
-                self.send_csv_response(generate_leaderboard_csv(filtered_lb_csv), file_name_csv)
+                    self.send_error(400, "Bad Request", "Invalid category for export."); return
+                file_stem = f"leaderboard_{cfg.category_display_names.get(cat_key_csv,cat_key_csv).replace(' ','_')}"
+                self.send_export_response(export_format, cat_key_csv, file_stem, cfg)
             else: self.send_error(404, "Not Found", f"Resource '{req_path}' not found.")
         except Exception as e_get:
              print(f"Error handling GET {self.path}: {e_get}")
              if not getattr(self, 'headers_sent', False): self.send_error(500, "Internal Server Error")
 
+    @timed_request
     def do_POST(self):
         req_path_post = self.path
         try:
             if req_path_post == "/save_answers": self.handle_save_answers()
             elif req_path_post == "/admin_reset": self.handle_admin_reset()
+            elif req_path_post == "/admin_freeze": self.handle_admin_freeze()
             elif req_path_post == "/admin_manual_add": self.handle_manual_add()
+            elif req_path_post == "/admin_profile": self.handle_admin_profile()
+            elif req_path_post == "/admin_tracemalloc": self.handle_admin_tracemalloc()
             elif req_path_post == "/add": self.handle_add_via_post() # For testing/ESP32
             else: self.send_error(405, "Method Not Allowed", f"POST not supported for '{req_path_post}'.")
         except Exception as e_post:
@@ -594,22 +2343,14 @@ class SimpleRequestHandler(BaseHTTPRequestHandler):
              if not getattr(self, 'headers_sent', False): self.send_error(500, "Internal Server Error")
 
     def handle_save_answers(self):
-        global GENERAL_MAX_QUESTIONS, PENALTY_PER_INCORRECT, CATEGORY_DISPLAY_NAMES, NUM_QUESTIONS_PER_CATEGORY, CATEGORY_SECTIONS, correct_answers_config
         try:
             content_len = int(self.headers.get('Content-Length', 0))
             if content_len > 50 * 1024: self.send_error(413, "Payload Too Large"); return
             form_post_data = self.rfile.read(content_len).decode('utf-8')
             parsed_form = urllib.parse.parse_qs(form_post_data)
 
-            # Start with a deep copy of current config to modify
-            cfg_to_update = {
-                "penalty": PENALTY_PER_INCORRECT,
-                "general_max_questions": GENERAL_MAX_QUESTIONS,
-                "num_questions_per_category": NUM_QUESTIONS_PER_CATEGORY.copy(),
-                "category_display_names": CATEGORY_DISPLAY_NAMES.copy(),
-                "categories": {k:v.copy() for k,v in correct_answers_config.get("categories", {}).items()}, # Correct answers
-                "category_sections": {k: [s.copy() for s in v] for k,v in CATEGORY_SECTIONS.items()}
-            }
+            # Start with a fresh mutable copy of the current config snapshot
+            cfg_to_update = active_config.to_dict()
 
             # 1. General Config
             cfg_to_update["penalty"] = max(0, int(parsed_form.get("penalty", [str(cfg_to_update['penalty'])])[0]))
@@ -664,7 +2405,8 @@ class SimpleRequestHandler(BaseHTTPRequestHandler):
             cfg_to_update["categories"] = new_correct_answers_all_cats
 
             # 5. Save the complete validated configuration
-            save_correct_answers_config(cfg_to_update) # This function also updates globals
+            save_correct_answers_config(cfg_to_update) # This function also publishes the new snapshot
+            rescore_job.start() # Stored entries are rescored against the new key/penalty in the background
             self.send_redirect_response("/admin")
         except Exception as e_save:
             print(f"CRITICAL Error in handle_save_answers: {e_save}")
@@ -685,8 +2427,65 @@ class SimpleRequestHandler(BaseHTTPRequestHandler):
             print(f"Error during admin_reset: {e_reset}")
             if not getattr(self, 'headers_sent', False): self.send_error(500, "Reset failed.")
 
+    def handle_admin_freeze(self):
+        try:
+            content_len_freeze = int(self.headers.get('Content-Length',0)); post_data_freeze = self.rfile.read(content_len_freeze).decode('utf-8')
+            form_data_freeze = urllib.parse.parse_qs(post_data_freeze)
+            if form_data_freeze.get("password",[""])[0] != ADMIN_PASSWORD:
+                self.send_response(403); self.send_header("Content-type","text/html;charset=utf-8"); self.end_headers()
+                self.wfile.write("<h1>403 Forbidden</h1><p>Incorrect admin password for freeze.</p><p><a href='/admin'>Back</a></p>".encode('utf-8'))
+                return
+            if form_data_freeze.get("action",[""])[0] == "unfreeze": unfreeze_board()
+            else: freeze_board()
+            self.send_redirect_response("/admin")
+        except Exception as e_freeze:
+            print(f"Error during admin_freeze: {e_freeze}")
+            if not getattr(self, 'headers_sent', False): self.send_error(500, "Freeze failed.")
+
+    def read_admin_form(self, action_desc):
+        # Parses a form POST; sends 403 and returns None unless it carries the admin password
+        content_len_form = int(self.headers.get('Content-Length',0)); form_data = urllib.parse.parse_qs(self.rfile.read(content_len_form).decode('utf-8'))
+        if form_data.get("password",[""])[0] == ADMIN_PASSWORD: return form_data
+        self.send_response(403); self.send_header("Content-type","text/html;charset=utf-8"); self.end_headers()
+        self.wfile.write(f"<h1>403 Forbidden</h1><p>Incorrect admin password for {action_desc}.</p><p><a href='/admin'>Back</a></p>".encode('utf-8'))
+        return None
+
+    def handle_admin_profile(self):
+        # Samples all threads for the requested seconds (this worker waits meanwhile) and returns collapsed stacks
+        try:
+            form_data_prof = self.read_admin_form("profiling")
+            if form_data_prof is None: return
+            try: profile_seconds = float(form_data_prof.get("seconds",[str(PROFILE_DEFAULT_SECONDS)])[0])
+            except ValueError: profile_seconds = -1
+            if not 0 < profile_seconds <= PROFILE_MAX_SECONDS:
+                self.send_error(400, "Bad Request", f"seconds must be between 0 and {PROFILE_MAX_SECONDS}."); return
+            if not profile_lock.acquire(blocking=False):
+                self.send_error(409, "Conflict", "A profile is already running."); return
+            try:
+                print(f"Profiling all threads for {profile_seconds:g} s...")
+                sample_count, stack_counts = sample_thread_stacks(profile_seconds)
+            finally: profile_lock.release()
+            collapsed = "".join(f"{stack} {count}\n" for stack, count in sorted(stack_counts.items(), key=lambda item: -item[1]))
+            self.send_body("text/plain; charset=utf-8", collapsed.encode("utf-8"), None,
+                           (("Cache-Control", "no-store"), ("X-Profile-Samples", str(sample_count)),
+                            ("Content-Disposition", f'attachment; filename="leaderboard-{time.strftime("%Y%m%d-%H%M%S")}.collapsed"')))
+        except Exception as e_prof:
+            print(f"Error during admin_profile: {e_prof}")
+            if not getattr(self, 'headers_sent', False): self.send_error(500, "Profiling failed.")
+
+    def handle_admin_tracemalloc(self):
+        try:
+            form_data_tm = self.read_admin_form("tracemalloc")
+            if form_data_tm is None: return
+            try: report_text = run_tracemalloc_action(form_data_tm.get("action",["diff"])[0])
+            except ValueError as e_tm_action: self.send_error(400, "Bad Request", str(e_tm_action)); return
+            self.send_body("text/plain; charset=utf-8", report_text.encode("utf-8"), None, (("Cache-Control", "no-store"),))
+        except Exception as e_tm:
+            print(f"Error during admin_tracemalloc: {e_tm}")
+            if not getattr(self, 'headers_sent', False): self.send_error(500, "tracemalloc failed.")
+
     def handle_manual_add(self):
-        global GENERAL_MAX_QUESTIONS, CATEGORY_NAMES_CONFIG_KEYS, ADMIN_PASSWORD
+        global CATEGORY_NAMES_CONFIG_KEYS, ADMIN_PASSWORD
         try:
             content_len_man = int(self.headers.get('Content-Length',0)); post_data_man = self.rfile.read(content_len_man).decode('utf-8')
             form_data_man = urllib.parse.parse_qs(post_data_man)
@@ -706,9 +2505,9 @@ class SimpleRequestHandler(BaseHTTPRequestHandler):
             except: self.send_error(400, "Bad Request", "Invalid time for manual add."); return
             
             man_answers_dict = {}
-            # Manual entry form allows answers up to GENERAL_MAX_QUESTIONS
-            # add_to_leaderboard will use NUM_QUESTIONS_PER_CATEGORY[man_cat_key] for scoring
-            for q_idx_man in range(1, GENERAL_MAX_QUESTIONS + 1):
+            # Manual entry form allows answers up to general_max_questions
+            # add_to_leaderboard will use the category's question count for scoring
+            for q_idx_man in range(1, active_config.general_max_questions + 1):
                 ans_man = form_data_man.get(f"manual_answer_{q_idx_man}",[""])[0].strip()
                 if ans_man in ["A","B","C","D"]: man_answers_dict[str(q_idx_man)] = ans_man
             
@@ -723,10 +2522,18 @@ class SimpleRequestHandler(BaseHTTPRequestHandler):
         try:
             content_len_add = int(self.headers.get('Content-Length',0)); post_data_add = self.rfile.read(content_len_add)
             json_payload = json.loads(post_data_add.decode('utf-8'))
-            if isinstance(json_payload, dict) and all(k in json_payload for k in ["name","time","answers","category_uid"]):
+            if isinstance(json_payload, dict) and all(k in json_payload for k in ["name","time","answers","category_uid"]) and isinstance(json_payload["answers"], dict):
                 cat_key_add = get_category_name_from_uid_str(json_payload["category_uid"])
+                submission_id = submission_id_from_payload(json_payload)
+                if submission_dedupe.is_duplicate(submission_id): # Retry of a committed submission: same ack, store untouched
+                    self.send_response(201); self.send_header("X-Duplicate-Submission", "1"); self.end_headers()
+                    print(f"Duplicate submission {submission_id} via POST acked."); return
                 if cat_key_add:
-                    add_to_leaderboard(json_payload["name"], float(json_payload["time"]), json_payload["answers"], cat_key_add)
+                    retry_after = ingest_admission.admit(json_payload.get("device_id") if submission_id else self.client_address[0])
+                    if retry_after: # Refuse fast; the client's retry/backoff takes it from here
+                        self.send_response(503); self.send_header("Retry-After", str(retry_after))
+                        self.send_header("Content-Length", "0"); self.end_headers(); return
+                    add_to_leaderboard(json_payload["name"], float(json_payload["time"]), json_payload["answers"], cat_key_add, submission_id)
                     self.send_response(201); self.end_headers(); print(f"Entry added via POST for {json_payload['name']}")
                 else: self.send_error(400, "Bad Request", f"Invalid category_uid in POST: {json_payload['category_uid']}")
             else: self.send_error(400, "Bad Request", "Invalid JSON structure for POST /add")
@@ -735,34 +2542,86 @@ class SimpleRequestHandler(BaseHTTPRequestHandler):
             print(f"Error during POST /add: {e_add_post}")
             if not getattr(self, 'headers_sent', False): self.send_error(500, "POST /add failed.")
 
-    def send_html_response(self, html_str):
+    def response_encoding(self, content_type, body_len):
+        # Content-Encoding to use for this request's response, or None
+        if body_len < COMPRESSION_MIN_BYTES or not content_type.startswith(COMPRESSIBLE_TYPES): return None
+        return choose_content_encoding(self.headers.get("Accept-Encoding"))
+
+    def send_body(self, content_type, body, cache_key=None, extra_headers=(), status_code=200):
+        # Sends body compressed when the client accepts it; cache_key (a content version) lets repeats skip compression
+        encoding = self.response_encoding(content_type, len(body))
+        if encoding is not None: body = compress_body(body, encoding, cache_key)
+        self.send_response(status_code); self.send_header("Content-type", content_type)
+        if content_type.startswith(COMPRESSIBLE_TYPES): self.send_header("Vary", "Accept-Encoding")
+        if encoding is not None: self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        for header_name, header_value in extra_headers: self.send_header(header_name, header_value)
+        self.end_headers(); self.wfile.write(body)
+        setattr(self, 'headers_sent', True)
+
+    def send_html_response(self, html_str, cache_key=None):
         try:
-            encoded_content = html_str.encode("utf-8")
-            self.send_response(200); self.send_header("Content-type", "text/html; charset=utf-8")
-            self.send_header("Content-Length", str(len(encoded_content)))
-            self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
-            self.send_header("Pragma", "no-cache"); self.send_header("Expires", "0")
-            self.end_headers(); self.wfile.write(encoded_content)
-            setattr(self, 'headers_sent', True)
+            html_bytes = html_str if isinstance(html_str, bytes) else html_str.encode("utf-8") # Compiled pages are bytes already
+            self.send_body("text/html; charset=utf-8", html_bytes, cache_key,
+                           (("Cache-Control", "no-cache, no-store, must-revalidate"), ("Pragma", "no-cache"), ("Expires", "0")))
         except Exception as e_send_html:
              print(f"Error sending HTML response: {e_send_html}")
              if not getattr(self, 'headers_sent', False): # Try to send error if headers not already sent
                  try: self.send_error(500, "Internal Server Error", "Failed to generate HTML response")
                  except: pass # Ignore error during error sending
 
-    def send_csv_response(self, csv_content_str, file_name_str):
+    def send_json_response(self, payload, status_code=200):
+        try:
+            encoded_content = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self.send_body("application/json; charset=utf-8", encoded_content, None, (("Cache-Control", "no-cache"),), status_code)
+        except Exception as e_send_json:
+             print(f"Error sending JSON response: {e_send_json}")
+             if not getattr(self, 'headers_sent', False):
+                 try: self.send_error(500, "Internal Server Error", "Failed to generate JSON response")
+                 except: pass
+
+    def send_export_response(self, export_format, category_key, file_stem, cfg):
+        # Cached bytes with Content-Length when this board/config version was exported before; otherwise the
+        # generator is streamed (chunked on HTTP/1.1, close-delimited on HTTP/1.0) and the result cached if small enough
+        file_name_str = f"{file_stem}.{EXPORT_FORMATS[export_format][1]}"
         try:
-            bom_plus_csv_bytes = b'\xef\xbb\xbf' + csv_content_str.encode("utf-8") # BOM for Excel
-            self.send_response(200); self.send_header("Content-type", "text/csv; charset=utf-8")
+            content_type, _, generate_export = EXPORT_FORMATS[export_format]
+            board = leaderboard_store.snapshot()
+            version_key = (board.version, cfg.version)
             safe_file_name = urllib.parse.quote(file_name_str.replace('"', "'"))
-            self.send_header("Content-Disposition", f'attachment; filename="{safe_file_name}"')
-            self.send_header("Content-Length", str(len(bom_plus_csv_bytes)))
-            self.end_headers(); self.wfile.write(bom_plus_csv_bytes)
-            setattr(self, 'headers_sent', True)
-        except Exception as e_send_csv:
-             print(f"Error sending CSV response ({file_name_str}): {e_send_csv}")
+            disposition_header = (("Content-Disposition", f'attachment; filename="{safe_file_name}"'),)
+            cached = _export_cache.get((export_format, category_key))
+            if cached is not None and cached[0] == version_key:
+                self.send_body(content_type, cached[1], ("export", export_format, category_key) + version_key, disposition_header); return
+            encoding = self.response_encoding(content_type, COMPRESSION_MIN_BYTES) # Size unknown until generated
+            compressor = make_compressor(encoding) if encoding is not None else None
+            if self.request_version != "HTTP/1.0": self.protocol_version = "HTTP/1.1" # Chunked needs a 1.1 status line
+            self.send_response(200); self.send_header("Content-type", content_type)
+            self.send_header(*disposition_header[0])
+            if content_type.startswith(COMPRESSIBLE_TYPES): self.send_header("Vary", "Accept-Encoding")
+            if encoding is not None: self.send_header("Content-Encoding", encoding)
+            use_chunks = self.protocol_version == "HTTP/1.1"
+            if use_chunks: self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Connection", "close")
+            self.end_headers(); setattr(self, 'headers_sent', True)
+            kept, kept_size = [], 0
+            def send_piece(piece):
+                if not piece: return
+                self.wfile.write(f"{len(piece):X}\r\n".encode("ascii") + piece + b"\r\n" if use_chunks else piece)
+                self.wfile.flush() # Backpressure: wait until the client has taken the previous piece
+            for chunk in generate_export(filter_leaderboard_by_category(board, category_key), cfg):
+                if not chunk: continue
+                send_piece(compressor.compress(chunk) if compressor is not None else chunk)
+                if kept is not None:
+                    kept.append(chunk); kept_size += len(chunk)
+                    if kept_size > EXPORT_CACHE_MAX_BYTES: kept = None # Too big to keep; later downloads stream again
+            if compressor is not None: send_piece(compressor.flush())
+            if kept is not None: _export_cache[(export_format, category_key)] = (version_key, b"".join(kept))
+            if use_chunks: self.wfile.write(b"0\r\n\r\n")
+        except Exception as e_send_export:
+             print(f"Error sending export response ({file_name_str}): {e_send_export}")
              if not getattr(self, 'headers_sent', False):
-                 try: self.send_error(500, "Internal Server Error", "Failed to generate CSV")
+                 try: self.send_error(500, "Internal Server Error", "Failed to generate export")
                  except: pass
     
     def send_redirect_response(self, target_location):
@@ -773,11 +2632,21 @@ class SimpleRequestHandler(BaseHTTPRequestHandler):
 
 
 # --- Network and UI Helpers ---
+startup_timings = {} # phase -> seconds since process_started_at, each recorded once
+
+def note_startup(phase):
+    if phase in startup_timings: return
+    startup_timings[phase] = time.perf_counter() - process_started_at
+    print(f"Startup: {phase.replace('_', ' ')} after {startup_timings[phase] * 1000:.0f} ms")
+
+@functools.lru_cache(maxsize=1)
 def get_server_ip():
+    # The UDP "connect" only picks the outgoing interface (nothing is sent), and a private target keeps it working
+    # on an offline event network that still has a LAN route
     s_ip = None
     try:
         s_ip = socket.socket(socket.AF_INET, socket.SOCK_DGRAM); s_ip.settimeout(0.1)
-        s_ip.connect(("8.8.8.8", 80)); local_ip_addr = s_ip.getsockname()[0]
+        s_ip.connect(("10.254.254.254", 80)); local_ip_addr = s_ip.getsockname()[0]
         if not local_ip_addr.startswith("127."): return local_ip_addr
     except Exception: pass
     finally:
@@ -789,6 +2658,9 @@ def get_server_ip():
     return "localhost"
 
 def show_ip_popup(ip_addr, port_num):
+    import tkinter as tk
+    from tkinter import ttk
+    import webbrowser
     popup_win = tk.Tk(); popup_win.title("Server beží"); popup_win.attributes('-topmost', True)
     popup_win.geometry("380x130"); popup_win.resizable(False, False)
     tk.Label(popup_win, text="Web server beží na adrese:", font=("Segoe UI", 10)).pack(pady=(10,2))
@@ -807,70 +2679,201 @@ def show_ip_popup(ip_addr, port_num):
     popup_win.after(1000, lambda u=server_url: webbrowser.open(u)) # Open after a short delay
     popup_win.mainloop()
 
-def run_web_server(host_addr, port_val):
-    web_httpd = None
+# --- Async Core (HTTP front end + serial ingest + state owner in one event loop) ---
+http_executor = None
+
+class BufferedRequestHandler(SimpleRequestHandler):
+    # Runs the normal routes on an already-read request inside the worker pool; output goes through wfile_stream
+    def __init__(self, raw_request, client_address, wfile_stream):
+        self.rfile = io.BytesIO(raw_request); self.wfile = wfile_stream
+        self.client_address = client_address; self.server = None; self.request = None
+        self.close_connection = True
+        self.handle_one_request()
+
+class LoopStreamWriter:
+    # File-like wfile for worker threads: writes are handed to the event loop in order, flush() waits for drain
+    def __init__(self, loop, writer):
+        self._loop = loop; self._writer = writer
+
+    def write(self, data):
+        self._loop.call_soon_threadsafe(self._writer.write, bytes(data)); return len(data)
+
+    def flush(self):
+        asyncio.run_coroutine_threadsafe(self._writer.drain(), self._loop).result()
+
+async def stream_leaderboard_events(writer, category_key, last_event_id, window=None):
+    # Server-Sent Events; event id = table ETag without quotes. When the board changes, a client that is up to date
+    # with the config and freeze state gets a "delta" event (JSON rows put since its version, from the changelog);
+    # otherwise it gets the whole table fragment as a "table" event. A reconnecting EventSource sends
+    # Last-Event-ID and only gets something if it missed a change. A windowed view (top N, a page, the participant's
+    # row) cannot be patched from rows alone, so it gets the re-rendered window whenever its category changes.
+    loop = asyncio.get_running_loop()
+    writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\nCache-Control: no-cache\r\n"
+                 b"X-Accel-Buffering: no\r\n\r\nretry: 3000\n\n")
+    for encoding in _COMPRESSION_WBITS: # A polled compressed table's ETag names the same version
+        if last_event_id and last_event_id.endswith("-" + encoding): last_event_id = last_event_id[:-len(encoding) - 1]
+    seen = parse_table_event_id(last_event_id)
+    generation = leaderboard_events.generation
+    while True:
+        cfg = active_config; frozen = frozen_board
+        board = frozen[0] if frozen is not None else leaderboard_store.snapshot()
+        changed = None
+        if seen is not None and seen[1] == cfg.version and seen[2] == (frozen is not None):
+            changed = board.changes_since(seen[0], category_key)
+        if changed is None or (changed and window is not None):
+            table_etag, table_body = await loop.run_in_executor(http_executor, get_leaderboard_table_render, category_key, cfg, window)
+            event_id = table_etag.strip('"')
+            data_lines = b"".join(b"data: " + line + b"\n" for line in table_body.split(b"\n"))
+            writer.write(b"id: " + event_id.encode("utf-8") + b"\nevent: table\n" + data_lines + b"\n")
+            seen = parse_table_event_id(event_id)
+        elif board.version != seen[0]:
+            if changed: # Changes in other categories only move the client's version along
+                event_id = table_event_id(board.version, cfg.version, frozen is not None, category_key)
+                delta_json = json.dumps({"rows": [leaderboard_row_json(pair, cfg) for pair in changed]}, ensure_ascii=False, separators=(",", ":"))
+                writer.write(b"id: " + event_id.encode("utf-8") + b"\nevent: delta\ndata: " + delta_json.encode("utf-8") + b"\n\n")
+            seen = (board.version, cfg.version, frozen is not None)
+        await writer.drain() # Raises once the client has gone away
+        new_generation = await leaderboard_events.wait(generation, SSE_KEEPALIVE_SECONDS)
+        if new_generation == generation: writer.write(b": keepalive\n\n")
+        generation = new_generation
+
+async def handle_http_connection(reader, writer):
+    loop = asyncio.get_running_loop()
     try:
-        HTTPServer.allow_reuse_address = True # Allow quick restarts
-        web_httpd = HTTPServer((host_addr, port_val), SimpleRequestHandler)
-        determined_ip = get_server_ip()
-        print(f"--- Web server starting on {host_addr}:{port_val} (Accessible via http://{determined_ip}:{port_val}) ---")
-        print("Press Ctrl+C in this console to stop the server."); web_httpd.serve_forever()
+        try: head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HTTP_READ_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError): return
+        request_line, _, header_block = head.partition(b"\r\n")
+        req_headers = http.client.parse_headers(io.BytesIO(header_block))
+        try: content_len = max(0, min(int(req_headers.get("Content-Length", 0)), HTTP_MAX_BODY_BYTES))
+        except ValueError: content_len = 0
+        body = await asyncio.wait_for(reader.readexactly(content_len), HTTP_READ_TIMEOUT) if content_len else b""
+        req_parts = request_line.decode("latin-1").split()
+        if len(req_parts) >= 2 and req_parts[0] == "GET" and urllib.parse.urlparse(req_parts[1]).path == "/events":
+            query_data = urllib.parse.parse_qs(urllib.parse.urlparse(req_parts[1]).query)
+            sel_cat_key_events = query_data.get("category", ["All Categories"])[0]
+            if sel_cat_key_events not in active_config.category_display_names: sel_cat_key_events = "All Categories"
+            last_event_id = req_headers.get("Last-Event-ID") or query_data.get("last_event_id", [None])[0]
+            try: window = parse_leaderboard_window(query_data)
+            except ValueError: window = None
+            await stream_leaderboard_events(writer, sel_cat_key_events, last_event_id, window)
+        else:
+            await loop.run_in_executor(http_executor, BufferedRequestHandler, head + body,
+                                       writer.get_extra_info("peername"), LoopStreamWriter(loop, writer))
+            await writer.drain()
+            if "first_request_served" not in startup_timings: note_startup("first_request_served")
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError): pass # Client went away
+    except Exception as e_conn: print(f"Error on HTTP connection: {e_conn}")
+    finally:
+        writer.close()
+        try: await writer.wait_closed()
+        except Exception: pass
+
+async def run_async_core(host_addr, port_val):
+    global http_executor
+    loop = asyncio.get_running_loop()
+    http_executor = concurrent.futures.ThreadPoolExecutor(max_workers=HTTP_WORKER_THREADS, thread_name_prefix="HTTPWorker")
+    leaderboard_state.bind(loop); leaderboard_events.bind(loop)
+    owner_task = asyncio.create_task(leaderboard_state.run(), name="LeaderboardStateOwner")
+    web_server = await asyncio.start_server(handle_http_connection, host_addr, port_val, reuse_address=True)
+    note_startup("listening")
+    serial_task = asyncio.create_task(serial_ingest_task(), name="SerialIngest")
+    determined_ip = get_server_ip()
+    print(f"--- Web server starting on {host_addr}:{port_val} (Accessible via http://{determined_ip}:{port_val}) ---")
+    print("Press Ctrl+C in this console to stop the server.")
+    async with web_server:
+        serve_task = asyncio.create_task(web_server.serve_forever(), name="HTTPServer")
+        # If the owner died, every /add and serial result would wait forever: a crash in any of these ends the server
+        # (and the process, see run_web_server) with its traceback. The serial task may finish normally (no port set).
+        await asyncio.wait((serve_task, owner_task, serial_task), return_when=asyncio.FIRST_EXCEPTION)
+        for core_task in (owner_task, serial_task, serve_task):
+            if core_task.done() and not core_task.cancelled() and core_task.exception() is not None:
+                print(f"\nERROR: {core_task.get_name()} task crashed; stopping the server.")
+                core_task.result() # Re-raises it
+
+def run_web_server(host_addr, port_val):
+    try: asyncio.run(run_async_core(host_addr, port_val))
     except OSError as os_err:
          if os_err.errno in [98, 48, 10048]: # Common "Address already in use" codes
              print(f"\nERROR: Port {port_val} is already in use on {host_addr}.")
-             messagebox.showerror("Server Error", f"Port {port_val} is already in use.\nClose other apps or change WEB_SERVER_PORT.")
+             show_error_dialog("Server Error", f"Port {port_val} is already in use.\nClose other apps or change WEB_SERVER_PORT.")
          else:
              print(f"\nERROR: Could not start web server: {os_err}")
-             messagebox.showerror("Server Error", f"Could not start web server on {port_val}.\nError: {os_err}")
+             show_error_dialog("Server Error", f"Could not start web server on {port_val}.\nError: {os_err}")
          os._exit(1) # Force exit if server cannot start
     except KeyboardInterrupt: print("\nWeb server stopping (Ctrl+C).")
-    except Exception as e_web_serv: print(f"\nUnexpected web server error: {e_web_serv}")
-    finally:
-        if web_httpd: web_httpd.server_close(); print("Web server closed.")
+    except Exception as e_web_serv:
+        print(f"\nUnexpected web server error: {e_web_serv}")
+        import traceback; traceback.print_exc()
+        show_error_dialog("Server Error", f"The web server stopped unexpectedly.\nError: {e_web_serv}")
+        print("Web server closed."); os._exit(1) # Nothing could be stored any more; don't leave a half-dead process running
+    finally: print("Web server closed.")
 
 # --- Main Execution ---
-if __name__ == "__main__":
+def parse_command_line(argv=None):
+    parser = argparse.ArgumentParser(description="Quiz leaderboard: reads results from the serial bridge and serves the web leaderboard.")
+    parser.add_argument("--headless", action="store_true", help="no windows: detect the bridge by USB ID, log to the console only")
+    parser.add_argument("--serial-port", help="bridge serial port (e.g. COM5, /dev/ttyUSB0); skips detection")
+    parser.add_argument("--usb-id", action="append", type=parse_usb_id, metavar="VID:PID",
+                        help="bridge USB ID in hex, PID may be * (repeatable, first match wins; default: common ESP32/USB-UART IDs)")
+    parser.add_argument("--usb-serial", help="USB serial number of the bridge adapter")
+    parser.add_argument("--host", default=WEB_SERVER_HOST, help=f"web server address (default {WEB_SERVER_HOST})")
+    parser.add_argument("--port", type=int, default=WEB_SERVER_PORT, help=f"web server port (default {WEB_SERVER_PORT})")
+    parser.add_argument("--storage", choices=("journal", "sqlite"), default=STORAGE_BACKEND, help=f"storage backend (default {STORAGE_BACKEND})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global HEADLESS, SERIAL_PORT, SERIAL_USB_IDS, SERIAL_USB_SERIAL_NUMBER, STORAGE_BACKEND, leaderboard_storage, serial_bridge_match
+    cli_args = parse_command_line(argv)
+    HEADLESS = cli_args.headless
+    if cli_args.usb_id: SERIAL_USB_IDS = tuple(cli_args.usb_id)
+    if cli_args.usb_serial: SERIAL_USB_SERIAL_NUMBER = cli_args.usb_serial
+    if cli_args.storage != STORAGE_BACKEND:
+        STORAGE_BACKEND = cli_args.storage; leaderboard_storage = create_leaderboard_storage(STORAGE_BACKEND)
     print("--- Starting Leaderboard Application ---")
     load_correct_answers_config() # Load all config first
     load_leaderboard()
 
-    root_serial_gui = tk.Tk(); root_serial_gui.title("Select Serial Port")
-    try: num_avail_ports = len(list(serial.tools.list_ports.comports()))
-    except: num_avail_ports = 0
-    win_width_sel, win_height_sel = 400, 100 + max(1, num_avail_ports) * 30
-    root_serial_gui.geometry(f"{win_width_sel}x{win_height_sel}")
-    root_serial_gui.eval('tk::PlaceWindow . center'); root_serial_gui.attributes('-topmost', True)
-    
-    SERIAL_PORT = find_serial_port(root_serial_gui) # This function now handles its own mainloop
-
-    if SERIAL_PORT:
+    # Bridge: --serial-port, else detected by USB ID/serial number, else (windowed mode) the Tk port picker
+    serial_bridge_match = (SERIAL_USB_IDS, SERIAL_USB_SERIAL_NUMBER)
+    if cli_args.serial_port: SERIAL_PORT = cli_args.serial_port
+    else:
+        try: bridge_info = find_bridge_port_info(list(serial.tools.list_ports.comports()), *serial_bridge_match)
+        except Exception as e_detect: print(f"Serial port detection failed: {e_detect}"); bridge_info = None
+        if bridge_info is not None:
+            SERIAL_PORT = bridge_info.device; print(f"Serial bridge detected: {bridge_info.device} ({bridge_info.description})")
+        elif not HEADLESS: SERIAL_PORT = choose_serial_port_gui()
+    if SERIAL_PORT is not None:
+        # Follow the chosen adapter itself across replugs (a new port name), when it reports its USB identity
+        chosen_info = next((port_info for port_info in serial.tools.list_ports.comports() if port_info.device == SERIAL_PORT), None)
+        if chosen_info is not None and chosen_info.vid is not None:
+            serial_bridge_match = (((chosen_info.vid, chosen_info.pid),), chosen_info.serial_number)
+        elif cli_args.serial_port or not HEADLESS: serial_bridge_match = None # Pinned to that name
+
+    if HEADLESS:
+        if SERIAL_PORT: print(f"Selected serial port: {SERIAL_PORT}")
+        else: print("No serial bridge connected yet; it is picked up as soon as it is plugged in.")
+        run_web_server(cli_args.host, cli_args.port) # Runs until Ctrl+C
+    elif SERIAL_PORT:
         print(f"Selected serial port: {SERIAL_PORT}")
-        serial_listen_thread = threading.Thread(target=serial_listener, name="SerialListenerThread", daemon=True)
-        serial_listen_thread.start()
-        print("Serial listener thread initiated.")
-
-        web_server_thread_main = threading.Thread(target=run_web_server, args=(WEB_SERVER_HOST, WEB_SERVER_PORT), name="WebServerThread", daemon=True)
+        # One event loop serves HTTP, reads the serial port and owns the leaderboard state
+        web_server_thread_main = threading.Thread(target=run_web_server, args=(cli_args.host, cli_args.port), name="AsyncCoreThread", daemon=True)
         web_server_thread_main.start()
-        print("Web server thread initiating...")
+        print("Async core (web server + serial ingest) initiating...")
         time.sleep(0.7) # Brief pause for server to start or fail
 
         ip_for_popup = get_server_ip()
-        popup_thread_main = threading.Thread(target=show_ip_popup, args=(ip_for_popup, WEB_SERVER_PORT), name="PopupThread", daemon=True)
+        popup_thread_main = threading.Thread(target=show_ip_popup, args=(ip_for_popup, cli_args.port), name="PopupThread", daemon=True)
         popup_thread_main.start()
 
         print("--- Application is now running. Main thread will monitor sub-threads. ---")
         print("--- (Press Ctrl+C in console to attempt graceful shutdown of web server) ---")
         try:
             while True: # Keep main thread alive to catch Ctrl+C for server, and monitor threads
-                if not serial_listen_thread.is_alive() and SERIAL_PORT: # Check only if port was selected
-                    print("CRITICAL ERROR: Serial listener thread has died! Data from ESP32 will not be received.")
-                    messagebox.showerror("Thread Error", "Serial listener thread stopped unexpectedly. Check console and restart.")
-                    break 
                 if not web_server_thread_main.is_alive():
                     print("CRITICAL ERROR: Web server thread has died!")
                     # run_web_server already shows a messagebox on bind error and exits.
                     # If it dies for another reason, this is a fallback.
-                    messagebox.showerror("Thread Error", "Web server thread stopped unexpectedly. The leaderboard is down. Check console.")
+                    show_error_dialog("Thread Error", "Web server thread stopped unexpectedly. The leaderboard is down. Check console.")
                     break
                 time.sleep(2) # Check status every 2 seconds
         except KeyboardInterrupt:
@@ -885,3 +2888,6 @@ if __name__ == "__main__":
         # messagebox.showinfo("Exiting", "No serial port was selected. The application will now exit.") # Can be too intrusive if user just closes selection window
 
     print("--- Application Exit ---")
+
+if __name__ == "__main__":
+    main()
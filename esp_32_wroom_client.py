@@ -15,6 +15,11 @@ password = "yourpassword" # IMPORTANT: Match the password from your server.py
 server_ip = "192.168.4.1" # IMPORTANT: Change this to the IP address printed by your server.py
 server_port = 80
 
+# Device ID + run ID sent with each result so the server can drop retried duplicates
+DEVICE_ID = "".join(["{:02x}".format(b) for b in machine.unique_id()])
+RUN_ID_FILE = "/sd/run_id.txt" # Survives a reboot, so re-sending a run reuses its ID
+current_run_id = None # ID of the current run (valid even if the SD card write failed)
+
 # ----- SPI Pin Configurations -----
 # ... (rest of SPI and Pin configurations as before)
 # SD Card SPI (HSPI Pins)
@@ -128,6 +133,34 @@ def read_time_from_sdcard():
         print("Error reading time from SD card: {}".format(e))
         return None # Or raise the exception, depending on desired behavior
 
+def new_run_id():
+    """Random run ID (8 hex chars); unlike a counter it can't repeat after a card swap or reformat."""
+    return "".join(["{:02x}".format(b) for b in os.urandom(4)])
+
+def read_run_id():
+    """ID of the current run: from memory, after a reboot from the SD card, else a new (unique) one."""
+    global current_run_id
+    if current_run_id is None:
+        try:
+            with open(RUN_ID_FILE, "r") as f:
+                current_run_id = f.read().strip() or None
+        except OSError:
+            pass
+    if current_run_id is None:
+        current_run_id = new_run_id()
+    return current_run_id
+
+def start_new_run_id():
+    """Creates a new run ID and saves it to the SD card; called when a new run starts."""
+    global current_run_id
+    current_run_id = new_run_id()
+    try:
+        with open(RUN_ID_FILE, "w") as f:
+            f.write("{}\n".format(current_run_id))
+    except Exception as e:
+        print("Error saving run ID to SD card: {}".format(e))
+    return current_run_id
+
 def read_answers_from_sdcard():
     """Reads answers from the answers.txt file on the SD card."""
     answers = {}
@@ -200,7 +233,9 @@ def send_data(name, sta, category_uid_str): # Added category_uid_str parameter
         "name": name,
         "time": elapsed_time_from_sd,
         "answers": answers_from_sd, # Include answers in payload
-        "category_uid": category_uid_str # Include category UID string
+        "category_uid": category_uid_str, # Include category UID string
+        "device_id": DEVICE_ID,
+        "seq": read_run_id() # Same for every retry of this run
     }
     json_data = json.dumps(data_payload) # Convert to JSON string
     print("JSON Payload to send:", json_data) # Debug print JSON data
@@ -274,6 +309,7 @@ def handle_category_card(uid_str, uid_bytes):
     answers = {}
     last_category_uid = uid_bytes # Store the category UID bytes
     print("Project Reset - Timer Started for Category: {}".format(uid_str))
+    print("Run {} of device {}".format(start_new_run_id(), DEVICE_ID))
     delete_answer_time_files() # Delete answers.txt and timer_log.txt
     create_empty_answers_file() # Create a new empty answers.txt
     led1_pin.value(1)
@@ -91,6 +91,11 @@ SENDING_BLINK_INTERVAL_MS = 100   # Interval blikania (ms) pre LED1 počas odosi
 SD_MOUNT_POINT = "/sd"
 ANSWERS_FILE_PATH = SD_MOUNT_POINT + "/answers.txt"
 TIMER_FILE_PATH = SD_MOUNT_POINT + "/timer_log.txt"
+RUN_ID_FILE_PATH = SD_MOUNT_POINT + "/run_id.txt" # ID behu; prežije reštart, aby opakované odoslanie malo rovnaké ID
+
+# ID zariadenia + ID behu posielané s výsledkom: server podľa nich zahodí duplicitné opakované pokusy
+DEVICE_ID = "".join(["{:02x}".format(b) for b in machine.unique_id()])
+current_run_id = None # ID aktuálneho behu (platí aj keď zápis na SD kartu zlyhal)
 
 #----- Pomocné funkcie -----
 def byte_array_to_str(byte_arr):
@@ -166,6 +171,34 @@ def read_time_from_sdcard():
         print(f"Chyba pri čítaní času z SD karty: {e}")
         return None
 
+def new_run_id():
+    """Náhodné ID behu (8 hex znakov) - nezopakuje sa ani po výmene či naformátovaní SD karty."""
+    return "".join(["{:02x}".format(b) for b in os.urandom(4)])
+
+def read_run_id():
+    """ID aktuálneho behu: z pamäte, po reštarte z SD karty; ak nie je nikde, nové (jedinečné) ID."""
+    global current_run_id
+    if current_run_id is None:
+        try:
+            with open(RUN_ID_FILE_PATH, "r") as f:
+                current_run_id = f.read().strip() or None
+        except OSError:
+            pass
+    if current_run_id is None:
+        current_run_id = new_run_id()
+    return current_run_id
+
+def start_new_run_id():
+    """Vytvorí nové ID behu a uloží ho na SD kartu; volá sa pri štarte časovača."""
+    global current_run_id
+    current_run_id = new_run_id()
+    try:
+        with open(RUN_ID_FILE_PATH, "w") as f:
+            f.write(f"{current_run_id}\n")
+    except Exception as e:
+        print(f"Chyba pri ukladaní ID behu na SD kartu: {e}")
+    return current_run_id
+
 def read_answers_from_sdcard():
     """Prečíta odpovede zo súboru answers.txt (formát riadku: O#: O). Vráti slovník."""
     if vfs is None:
@@ -270,7 +303,9 @@ def send_data(name, sta_interface, category_uid_str):
         "name": name,
         "time": elapsed_time_from_sd,
         "answers": answers_from_sd, # Send the dictionary directly
-        "category_uid": category_uid_str
+        "category_uid": category_uid_str,
+        "device_id": DEVICE_ID,
+        "seq": read_run_id() # Rovnaké pri každom opakovanom pokuse o ten istý beh
     }
     try:
         json_data = json.dumps(data_payload)
@@ -425,6 +460,7 @@ def handle_start_timer_card(uid_str, uid_bytes):
     elapsed_time = 0 # Reset elapsed time for this run
     timer_running = True
     timer_stopped = False # Explicitly set to False
+    print(f"Beh {start_new_run_id()} zariadenia {DEVICE_ID}")
 
     print("--> Časovač spustený! <---")
     led2_pin.value(0) # Ensure error LED is off
@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import PC_leaderboard as L
+
+def make_journal(tmp_path):
+    return L.LeaderboardJournal(str(tmp_path / "leaderboard.json"), str(tmp_path / "leaderboard.journal"))
+
+def entry(name):
+    return {"name": name, "category": L.CATEGORY_NAMES_CONFIG_KEYS[0], "time": 100, "penalty": 0, "disqualified": False}
+
+def test_torn_first_record_is_truncated_before_the_next_append(tmp_path):
+    journal = make_journal(tmp_path)
+    with open(journal.journal_path, "w", encoding="utf-8") as f: f.write('{"op":"put","ent') # Crash mid-append
+    assert journal.load() == []
+    journal.append({"op": "put", "entry": entry("NEW")})
+    assert [e["name"] for e in make_journal(tmp_path).load()] == ["NEW"]
+
+def test_torn_tail_after_seen_records_is_truncated(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.append_many([{"op": "seen", "id": "dev:run:abc", "at": 1.0}])
+    with open(journal.journal_path, "a", encoding="utf-8") as f: f.write('{"op":"put","entry":{"na')
+    journal = make_journal(tmp_path)
+    assert journal.load() == [] and journal.submission_ids == {"dev:run:abc": 1.0}
+    journal.append({"op": "put", "entry": entry("NEW")})
+    reloaded = make_journal(tmp_path)
+    assert [e["name"] for e in reloaded.load()] == ["NEW"] and reloaded.submission_ids == {"dev:run:abc": 1.0}
+
+def test_complete_journal_is_left_untouched(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.append_many([{"op": "put", "entry": entry("A")}, {"op": "put", "entry": entry("B")}])
+    size = os.path.getsize(journal.journal_path)
+    assert [e["name"] for e in make_journal(tmp_path).load()] == ["A", "B"]
+    assert os.path.getsize(journal.journal_path) == size
+
+def test_records_since_snapshot_counts_alike_on_append_and_load(tmp_path):
+    storage = L.JournalStorage(make_journal(tmp_path), str(tmp_path / "config.json"))
+    storage.write_records([{"op": "seen", "id": "dev:run:abc", "at": L.time.time()}])
+    storage.replace_entries([entry("A")]) # Carries the "seen" record over the snapshot
+    assert storage.journal.records_since_snapshot == 0
+    assert storage.load_entries()[1] is False
+    storage.write_records([{"op": "seen", "id": "dev:run:def", "at": L.time.time()}])
+    counted = storage.journal.records_since_snapshot
+    reloaded = L.JournalStorage(make_journal(tmp_path), str(tmp_path / "config.json"))
+    assert reloaded.load_entries()[1] is True and reloaded.journal.records_since_snapshot == counted == 1